@@ -1,14 +1,16 @@
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy import select
 import os
+import time
 from dotenv import load_dotenv
 
-from app.database import get_db
+from app.cache import TTLCache
+from app.database import AsyncSessionLocal
+from app.passwords import hash_password, check_password
 from app.models import User
 
 load_dotenv()
@@ -17,14 +19,12 @@ SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 1440))
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
-
-def get_password_hash(password):
-    return pwd_context.hash(password)
+# Decoded token -> (user_id, email), so hot endpoints skip the users lookup
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", 10000))
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", 60))
+user_cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL_SECONDS)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -36,12 +36,17 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+async def get_current_user(token: str = Depends(oauth2_scheme)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    cached = user_cache.get(token)
+    if cached is not None:
+        user_id, email = cached
+        return User(user_id=user_id, email=email)
+    
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
@@ -50,7 +55,25 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
     except JWTError:
         raise credentials_exception
     
-    user = db.query(User).filter(User.email == email).first()
+    # Own short-lived session: the connection is back in the pool before the handler runs
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(select(User).where(User.email == email))
+        user = result.scalars().first()
     if user is None:
         raise credentials_exception
-    return user
\ No newline at end of file
+    
+    # Never cache a token beyond its own expiry
+    ttl = None
+    if payload.get("exp") is not None:
+        ttl = float(payload["exp"]) - time.time()
+    user_cache.set(token, (user.user_id, user.email), ttl=ttl)
+    return user
+
+def invalidate_user_cache(email: str):
+    """
+    Drop every cached token that resolves to this user
+    """
+    return user_cache.invalidate_where(lambda token, identity: identity[1] == email)
+
+def get_user_cache_stats():
+    return user_cache.stats()
\ No newline at end of file
@@ -0,0 +1,104 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+
+class TTLCache:
+    """
+    Thread-safe in-process cache with per-entry expiry and LRU eviction.
+    maxsize bounds the entry count, or the total weight when a weigher
+    (e.g. len for byte strings) is given.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 1024,
+        ttl: float = 300.0,
+        weigher: Optional[Callable[[Any], int]] = None,
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.weigher = weigher
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._weight = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+
+            value, expires_at, weight = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                self._weight -= weight
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        if self.maxsize <= 0:
+            return
+
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        weight = self.weigher(value) if self.weigher else 1
+        if ttl <= 0 or weight > self.maxsize:
+            return
+
+        with self._lock:
+            previous = self._data.pop(key, None)
+            if previous is not None:
+                self._weight -= previous[2]
+            self._data[key] = (value, time.monotonic() + ttl, weight)
+            self._weight += weight
+            while self._weight > self.maxsize:
+                _, (_, _, evicted) = self._data.popitem(last=False)
+                self._weight -= evicted
+                self.evictions += 1
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.pop(key, None)
+            if entry is not None:
+                self._weight -= entry[2]
+        return entry[0] if entry is not None else default
+
+    def invalidate_where(self, predicate: Callable[[Hashable, Any], bool]) -> int:
+        """
+        Drop every entry for which predicate(key, value) is true
+        """
+        with self._lock:
+            stale = [k for k, (v, _, _) in self._data.items() if predicate(k, v)]
+            for k in stale:
+                self._weight -= self._data.pop(k)[2]
+        return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._weight = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            size = len(self._data)
+            weight = self._weight
+        lookups = self.hits + self.misses
+        return {
+            "size": size,
+            "weight": weight,
+            "maxsize": self.maxsize,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
@@ -1,16 +1,181 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, QueuePool
 import os
+import threading
+import time
+import uuid
+from types import SimpleNamespace
 from dotenv import load_dotenv
 
+from app.sketch import DDSketch
+
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 
-engine = create_engine(DATABASE_URL)
+# Async driver URL; defaults to DATABASE_URL with the asyncpg driver swapped in
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or (
+    make_url(DATABASE_URL).set(drivername="postgresql+asyncpg").render_as_string(hide_password=False)
+)
+
+# Pool sizing. Each process holds up to (DB_POOL_SIZE + DB_MAX_OVERFLOW) +
+# (DB_ASYNC_POOL_SIZE + DB_ASYNC_MAX_OVERFLOW) connections: 40 + 10 = 50 by
+# default, so workers x 50 must fit under Postgres max_connections.
+# Sync: 40 matches FastAPI's threadpool, one connection per worker thread
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 10))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 30))
+# Async: event-loop handlers hold a connection only for short queries
+DB_ASYNC_POOL_SIZE = int(os.getenv("DB_ASYNC_POOL_SIZE", 5))
+DB_ASYNC_MAX_OVERFLOW = int(os.getenv("DB_ASYNC_MAX_OVERFLOW", 5))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))  # seconds; -1 never recycles
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+# Behind PgBouncer (transaction pooling): no app-side pool and no prepared statements
+DB_PGBOUNCER = os.getenv("DB_PGBOUNCER", "false").lower() == "true"
+DB_POOL_SAMPLE_INTERVAL_SECONDS = float(os.getenv("DB_POOL_SAMPLE_INTERVAL_SECONDS", 60))
+
+
+class PoolTelemetry:
+    """
+    Checkout counters for one engine's pool. Wait times go into a DDSketch
+    that covers the current window (since the last reset).
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.in_use = 0
+        self.checkouts = 0
+        self.overflow_opened = 0
+        self.timeouts = 0
+        self.connects = 0
+        self.wait_seconds_total = 0.0
+        self._window = DDSketch()
+        self._lock = threading.Lock()
+
+    def record_wait(self, seconds: float):
+        with self._lock:
+            self.wait_seconds_total += seconds
+            self._window.add(seconds * 1000)
+
+    def attach(self, engine):
+        """
+        Engine-level pool events, so they follow the pool across dispose()
+        """
+        @event.listens_for(engine, "connect")
+        def on_connect(dbapi_connection, connection_record):
+            self.connects += 1
+
+        @event.listens_for(engine, "checkout")
+        def on_checkout(dbapi_connection, connection_record, connection_proxy):
+            with self._lock:
+                self.in_use += 1
+                self.checkouts += 1
+
+        @event.listens_for(engine, "checkin")
+        def on_checkin(dbapi_connection, connection_record):
+            with self._lock:
+                self.in_use -= 1
+
+    def snapshot(self, pool, reset_window: bool = False) -> dict:
+        with self._lock:
+            window = self._window
+            if reset_window:
+                self._window = DDSketch()
+
+        def wait_ms(q):
+            value = window.quantile(q)
+            return round(value, 3) if value is not None else None
+
+        return {
+            "pool": type(pool).__name__,
+            "size": pool.size() if hasattr(pool, "size") else 0,
+            "max_overflow": getattr(pool, "_max_overflow", 0),
+            "in_use": self.in_use,
+            "idle": pool.checkedin() if hasattr(pool, "checkedin") else 0,
+            "overflow": max(pool.overflow(), 0) if hasattr(pool, "overflow") else 0,
+            "checkouts": self.checkouts,
+            "overflow_opened": self.overflow_opened,
+            "timeouts": self.timeouts,
+            "connects": self.connects,
+            "wait_seconds_total": round(self.wait_seconds_total, 3),
+            "window_checkouts": window.count,
+            "wait_ms_p50": wait_ms(0.5),
+            "wait_ms_p95": wait_ms(0.95),
+            "wait_ms_p99": wait_ms(0.99),
+            "wait_ms_max": round(window.max, 3) if window.max is not None else None,
+        }
+
+
+def instrumented_pool(pool_class, telemetry: PoolTelemetry):
+    """
+    Subclass of pool_class that times each checkout, including the wait for
+    a free connection (recreate() keeps the subclass)
+    """
+    class InstrumentedPool(pool_class):
+        def _do_get(self):
+            start = time.perf_counter()
+            try:
+                return super()._do_get()
+            except exc.TimeoutError:
+                telemetry.timeouts += 1
+                raise
+            finally:
+                telemetry.record_wait(time.perf_counter() - start)
+
+        def _inc_overflow(self):
+            # QueuePool only: called right before it opens a connection; past
+            # pool_size that connection is an overflow one
+            opened = super()._inc_overflow()
+            if opened and self._overflow > 0:
+                telemetry.overflow_opened += 1
+            return opened
+
+    InstrumentedPool.__name__ = InstrumentedPool.__qualname__ = pool_class.__name__
+    return InstrumentedPool
+
+
+def pool_options(pool_class, telemetry: PoolTelemetry, pool_size: int, max_overflow: int) -> dict:
+    if DB_PGBOUNCER:
+        return {"poolclass": instrumented_pool(NullPool, telemetry)}
+    return {
+        "poolclass": instrumented_pool(pool_class, telemetry),
+        "pool_size": pool_size,
+        "max_overflow": max_overflow,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+
+sync_pool_telemetry = PoolTelemetry("sync")
+async_pool_telemetry = PoolTelemetry("async")
+
+engine = create_engine(DATABASE_URL, **pool_options(QueuePool, sync_pool_telemetry, DB_POOL_SIZE, DB_MAX_OVERFLOW))
+sync_pool_telemetry.attach(engine)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine for handlers that run on the event loop (metrics, auth)
+async_url = make_url(ASYNC_DATABASE_URL)
+async_connect_args = {}
+if DB_PGBOUNCER:
+    # PgBouncer may hand each transaction a different server connection
+    async_url = async_url.update_query_dict({"prepared_statement_cache_size": "0"})
+    async_connect_args = {
+        "statement_cache_size": 0,
+        "prepared_statement_name_func": lambda: f"__asyncpg_{uuid.uuid4()}__",
+    }
+async_engine = create_async_engine(
+    async_url,
+    connect_args=async_connect_args,
+    **pool_options(AsyncAdaptedQueuePool, async_pool_telemetry, DB_ASYNC_POOL_SIZE, DB_ASYNC_MAX_OVERFLOW)
+)
+async_pool_telemetry.attach(async_engine.sync_engine)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
 
 def get_db():
@@ -18,4 +183,29 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+def get_pool_stats(reset_window: bool = False) -> dict:
+    return {
+        "sync": sync_pool_telemetry.snapshot(engine.pool, reset_window),
+        "async": async_pool_telemetry.snapshot(async_engine.sync_engine.pool, reset_window),
+    }
+
+async def sample_pool_stats():
+    """
+    Record one 'db_pool' metric per engine, covering checkout waits since
+    the previous sample; async so it stays on the loop with metrics_buffer
+    """
+    from app.metrics_buffer import metrics_buffer, MetricsBufferFull  # it imports this module
+
+    try:
+        metrics_buffer.add(None, [
+            SimpleNamespace(type="db_pool", data={"action": name, **stats})
+            for name, stats in get_pool_stats(reset_window=True).items()
+        ])
+    except MetricsBufferFull:
+        pass
@@ -0,0 +1,215 @@
+import os
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+from dotenv import load_dotenv
+from sqlalchemy import select, func, delete, and_, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal
+from app.email import enqueue_emails
+from app.email_templates import render_emails
+from app.models import User, FlashcardSet, Flashcard, ReviewState, ActiveUserDay, DigestDelivery
+
+load_dotenv()
+
+# Users handled per transaction; every query in a chunk is bounded by a user_id range
+DIGEST_CHUNK_USERS = int(os.getenv("DIGEST_CHUNK_USERS", 5000))
+# A set counts as unstudied when none of its cards was reviewed for this long;
+# never-reviewed sets count from their last edit instead
+DIGEST_STALE_DAYS = int(os.getenv("DIGEST_STALE_DAYS", 7))
+DIGEST_MAX_SETS = int(os.getenv("DIGEST_MAX_SETS", 3))
+# Hour of day (UTC) the in-app scheduler runs the digest; -1 disables it
+DIGEST_HOUR_UTC = int(os.getenv("DIGEST_HOUR_UTC", 14))
+DIGEST_HISTORY_DAYS = 30
+
+# Held for a whole run so only one worker generates the digest
+ADVISORY_LOCK_ID = 7231002
+
+
+def last_studied_label(last_studied: Optional[datetime], now: datetime) -> str:
+    if last_studied is None:
+        return "never studied"
+    days = (now - last_studied).days
+    return f"last studied {days} day{'s' if days != 1 else ''} ago"
+
+
+def query_due_counts(db: Session, first_id: int, last_id: int, now: datetime) -> Dict[int, int]:
+    rows = db.execute(
+        select(ReviewState.user_id, func.count())
+        .where(ReviewState.user_id.between(first_id, last_id), ReviewState.due_at <= now)
+        .group_by(ReviewState.user_id)
+    ).all()
+    return dict(rows)
+
+
+def query_stale_sets(db: Session, first_id: int, last_id: int, cutoff: datetime) -> Dict[int, dict]:
+    """
+    Per user: the DIGEST_MAX_SETS longest-unstudied non-empty sets, plus how
+    many stale sets there are in total
+    """
+    last_reviewed = func.max(ReviewState.last_reviewed_at)
+    last_activity = func.coalesce(last_reviewed, FlashcardSet.updated_at, FlashcardSet.created_at)
+    set_stats = select(
+        FlashcardSet.user_id,
+        FlashcardSet.set_id,
+        FlashcardSet.title,
+        func.count(Flashcard.card_id).label("card_count"),
+        last_reviewed.label("last_studied"),
+        last_activity.label("last_activity"),
+    ).join(
+        Flashcard, Flashcard.set_id == FlashcardSet.set_id
+    ).outerjoin(
+        ReviewState, and_(
+            ReviewState.user_id == FlashcardSet.user_id,
+            ReviewState.card_id == Flashcard.card_id
+        )
+    ).where(
+        FlashcardSet.user_id.between(first_id, last_id)
+    ).group_by(FlashcardSet.set_id).having(
+        last_activity < cutoff
+    ).subquery()
+
+    ranked = select(
+        set_stats,
+        func.row_number().over(
+            partition_by=set_stats.c.user_id,
+            order_by=(set_stats.c.last_activity.asc().nulls_first(), set_stats.c.set_id)
+        ).label("rank"),
+        func.count().over(partition_by=set_stats.c.user_id).label("stale_set_count"),
+    ).subquery()
+
+    result = defaultdict(lambda: {"stale_sets": [], "stale_set_count": 0})
+    for row in db.execute(select(ranked).where(ranked.c.rank <= DIGEST_MAX_SETS).order_by(ranked.c.rank)):
+        entry = result[row.user_id]
+        entry["stale_set_count"] = row.stale_set_count
+        entry["stale_sets"].append(row)
+    return result
+
+
+def query_last_active(db: Session, first_id: int, last_id: int) -> Dict[int, date]:
+    rows = db.execute(
+        select(ActiveUserDay.user_id, func.max(ActiveUserDay.day))
+        .where(ActiveUserDay.user_id.between(first_id, last_id))
+        .group_by(ActiveUserDay.user_id)
+    ).all()
+    return dict(rows)
+
+
+def build_digest_contexts(db: Session, users: list, now: datetime) -> List[dict]:
+    """
+    Digest content for one chunk of users from three grouped queries;
+    users with nothing due and no stale sets are left out
+    """
+    first_id, last_id = users[0].user_id, users[-1].user_id
+    due_counts = query_due_counts(db, first_id, last_id, now)
+    stale = query_stale_sets(db, first_id, last_id, now - timedelta(days=DIGEST_STALE_DAYS))
+    last_active = query_last_active(db, first_id, last_id)
+
+    contexts = []
+    for user in users:
+        due_count = due_counts.get(user.user_id, 0)
+        stale_sets = stale.get(user.user_id)
+        # Only nag about old sets when the user hasn't opened the app today
+        if stale_sets and last_active.get(user.user_id) == now.date():
+            stale_sets = None
+        if not due_count and not stale_sets:
+            continue
+
+        contexts.append({
+            "user_id": user.user_id,
+            "email": user.email,
+            "due_count": due_count,
+            "stale_sets": [
+                {"title": s.title, "card_count": s.card_count, "last_studied": last_studied_label(s.last_studied, now)}
+                for s in (stale_sets or {}).get("stale_sets", [])
+            ],
+            "stale_set_count": (stale_sets or {}).get("stale_set_count", 0),
+        })
+    return contexts
+
+
+def run_digest_chunk(db: Session, after_id: int, day: date, now: datetime) -> tuple:
+    """
+    Build, claim and enqueue digests for the next chunk of users in one
+    transaction; returns (last user_id seen or None, digests queued)
+    """
+    users = db.execute(
+        select(User.user_id, User.email, User.digest_opt_out)
+        .where(User.user_id > after_id)
+        .order_by(User.user_id)
+        .limit(DIGEST_CHUNK_USERS)
+    ).all()
+    if not users:
+        return None, 0
+
+    # Opted-out users still advance the chunk; they just get no digest
+    opted_out = {user.user_id for user in users if user.digest_opt_out}
+    contexts = [c for c in build_digest_contexts(db, users, now) if c["user_id"] not in opted_out]
+    if contexts:
+        # Users already claimed for today (an earlier or concurrent run) are skipped
+        claimed = set(db.execute(
+            pg_insert(DigestDelivery)
+            .values([{"day": day, "user_id": c["user_id"]} for c in contexts])
+            .on_conflict_do_nothing()
+            .returning(DigestDelivery.user_id)
+        ).scalars())
+        contexts = [c for c in contexts if c["user_id"] in claimed]
+
+        messages = render_emails("study_digest", contexts)
+        enqueue_emails(db, [
+            {"to_email": context["email"], **message}
+            for context, message in zip(contexts, messages)
+        ])
+
+    db.commit()
+    return users[-1].user_id, len(contexts)
+
+
+def run_daily_digest(engine: Engine, day: Optional[date] = None) -> dict:
+    """
+    Queue the study digest for every user who has something to study
+    """
+    now = datetime.utcnow()
+    day = day or now.date()
+    queued = 0
+
+    with engine.connect() as lock_conn:
+        if not lock_conn.execute(text("SELECT pg_try_advisory_lock(:id)"), {"id": ADVISORY_LOCK_ID}).scalar():
+            print("⚠️ Daily digest is already running in another worker")
+            return {"queued": 0, "skipped": True}
+        try:
+            with SessionLocal() as db:
+                after_id = 0
+                while after_id is not None:
+                    after_id, count = run_digest_chunk(db, after_id, day, now)
+                    queued += count
+
+                db.execute(delete(DigestDelivery).where(
+                    DigestDelivery.day < day - timedelta(days=DIGEST_HISTORY_DAYS)
+                ))
+                db.commit()
+        finally:
+            lock_conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": ADVISORY_LOCK_ID})
+            lock_conn.commit()
+
+    elapsed = (datetime.utcnow() - now).total_seconds()
+    print(f"✅ Queued {queued} study digests in {elapsed:.1f}s")
+    return {"queued": queued, "skipped": False}
+
+
+def seconds_until_next_run(hour: int) -> float:
+    now = datetime.utcnow()
+    next_run = now.replace(hour=hour, minute=0, second=0, microsecond=0)
+    if next_run <= now:
+        next_run += timedelta(days=1)
+    return (next_run - now).total_seconds()
+
+
+if __name__ == "__main__":
+    # python -m app.digest  -- queue today's digests now
+    from app.database import engine
+
+    run_daily_digest(engine)
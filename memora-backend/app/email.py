@@ -1,39 +1,31 @@
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
 from datetime import datetime, timedelta
 import secrets
-from typing import Optional
+from typing import List, Optional
+from sqlalchemy import event, insert
+from sqlalchemy.orm import Session
 
-# Email configuration for MailHog
-SMTP_HOST = "localhost"
-SMTP_PORT = 1025
-SENDER_EMAIL = "noreply@memora.com"
+from app.models import EmailOutbox
+from app.email_outbox import email_sender
+from app.email_templates import FRONTEND_URL, render_email
 
-def send_email(to_email: str, subject: str, html_content: str):
+def enqueue_emails(db: Session, messages: List[dict]) -> int:
     """
-    Send an email via local SMTP server (MailHog)
+    Add messages ({to_email, subject, html_body, text_body}) to the outbox
+    in the caller's transaction; the sender is woken once it commits
     """
-    try:
-        msg = MIMEMultipart('alternative')
-        msg['Subject'] = subject
-        msg['From'] = SENDER_EMAIL
-        msg['To'] = to_email
-        
-        # Add HTML content
-        html_part = MIMEText(html_content, 'html')
-        msg.attach(html_part)
-        
-        # Connect to SMTP server and send
-        with smtplib.SMTP(SMTP_HOST, SMTP_PORT) as server:
-            server.send_message(msg)
-            
-        print(f"✅ Email sent to {to_email}")
-        return True
-        
-    except Exception as e:
-        print(f"❌ Failed to send email: {e}")
-        return False
+    if not messages:
+        return 0
+    
+    now = datetime.utcnow()
+    db.execute(insert(EmailOutbox), [
+        {"text_body": None, **message, "status": "pending", "attempts": 0, "next_attempt_at": now, "created_at": now}
+        for message in messages
+    ])
+    event.listen(db, "after_commit", lambda session: email_sender.notify(), once=True)
+    return len(messages)
+
+def enqueue_email(db: Session, to_email: str, subject: str, html_body: str, text_body: Optional[str] = None):
+    return enqueue_emails(db, [{"to_email": to_email, "subject": subject, "html_body": html_body, "text_body": text_body}])
 
 def generate_reset_token() -> str:
     """
@@ -41,80 +33,10 @@ def generate_reset_token() -> str:
     """
     return secrets.token_urlsafe(32)
 
-def send_password_reset_email(to_email: str, reset_token: str):
+def queue_password_reset_email(db: Session, to_email: str, reset_token: str):
     """
-    Send password reset email with token
+    Queue the password reset email with token; delivered by app.email_outbox
     """
-    # Create reset link (this would be your frontend URL in production)
-    reset_link = f"http://localhost:3000/reset-password?token={reset_token}"
-    
-    html_content = f"""
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <style>
-            body {{
-                font-family: Arial, sans-serif;
-                line-height: 1.6;
-                color: #333;
-            }}
-            .container {{
-                max-width: 600px;
-                margin: 0 auto;
-                padding: 20px;
-            }}
-            .header {{
-                background-color: #4F46E5;
-                color: white;
-                padding: 20px;
-                text-align: center;
-                border-radius: 8px 8px 0 0;
-            }}
-            .content {{
-                background-color: #f9fafb;
-                padding: 30px;
-                border-radius: 0 0 8px 8px;
-            }}
-            .button {{
-                display: inline-block;
-                padding: 12px 24px;
-                background-color: #4F46E5;
-                color: white;
-                text-decoration: none;
-                border-radius: 6px;
-                margin: 20px 0;
-            }}
-            .footer {{
-                text-align: center;
-                margin-top: 20px;
-                font-size: 12px;
-                color: #6b7280;
-            }}
-        </style>
-    </head>
-    <body>
-        <div class="container">
-            <div class="header">
-                <h1>🔒 Password Reset Request</h1>
-            </div>
-            <div class="content">
-                <h2>Hello!</h2>
-                <p>You requested to reset your password for your Memora account.</p>
-                <p>Click the button below to reset your password:</p>
-                <a href="{reset_link}" class="button">Reset Password</a>
-                <p>Or copy and paste this link into your browser:</p>
-                <p style="word-break: break-all; background-color: #e5e7eb; padding: 10px; border-radius: 4px;">
-                    {reset_link}
-                </p>
-                <p><strong>This link will expire in 1 hour.</strong></p>
-                <p>If you didn't request this, you can safely ignore this email.</p>
-            </div>
-            <div class="footer">
-                <p>© 2024 Memora. All rights reserved.</p>
-            </div>
-        </div>
-    </body>
-    </html>
-    """
-    
-    return send_email(to_email, "Reset Your Memora Password", html_content)
\ No newline at end of file
+    reset_link = f"{FRONTEND_URL}/reset-password?token={reset_token}"
+    message = render_email("password_reset", reset_link=reset_link, expires_in="1 hour")
+    return enqueue_email(db, to_email, message["subject"], message["html_body"], message["text_body"])
@@ -0,0 +1,316 @@
+import asyncio
+import os
+import random
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+from typing import Dict, List, Optional
+import aiosmtplib
+from dotenv import load_dotenv
+from sqlalchemy import select, update, delete
+
+from app.database import AsyncSessionLocal
+from app.models import EmailOutbox
+
+load_dotenv()
+
+# SMTP server; defaults match the local MailHog setup
+SMTP_HOST = os.getenv("SMTP_HOST", "localhost")
+SMTP_PORT = int(os.getenv("SMTP_PORT", 1025))
+SMTP_USERNAME = os.getenv("SMTP_USERNAME") or None
+SMTP_PASSWORD = os.getenv("SMTP_PASSWORD") or None
+SMTP_USE_TLS = os.getenv("SMTP_USE_TLS", "false").lower() == "true"
+SMTP_TIMEOUT_SECONDS = float(os.getenv("SMTP_TIMEOUT_SECONDS", 30))
+SENDER_EMAIL = os.getenv("SENDER_EMAIL", "noreply@memora.com")
+
+EMAIL_SMTP_POOL_SIZE = int(os.getenv("EMAIL_SMTP_POOL_SIZE", 4))
+# Idle connections older than this are reopened rather than trusted
+EMAIL_SMTP_IDLE_SECONDS = float(os.getenv("EMAIL_SMTP_IDLE_SECONDS", 60))
+EMAIL_BATCH_SIZE = int(os.getenv("EMAIL_BATCH_SIZE", 100))
+EMAIL_POLL_INTERVAL_SECONDS = float(os.getenv("EMAIL_POLL_INTERVAL_SECONDS", 5))
+EMAIL_MAX_ATTEMPTS = int(os.getenv("EMAIL_MAX_ATTEMPTS", 8))
+EMAIL_RETRY_BASE_SECONDS = float(os.getenv("EMAIL_RETRY_BASE_SECONDS", 30))
+EMAIL_RETRY_MAX_SECONDS = float(os.getenv("EMAIL_RETRY_MAX_SECONDS", 3600))
+# A claimed message is retried by any worker if not settled within this time
+EMAIL_LEASE_SECONDS = float(os.getenv("EMAIL_LEASE_SECONDS", 300))
+EMAIL_RECIPIENT_LIMIT = int(os.getenv("EMAIL_RECIPIENT_LIMIT", 5))
+EMAIL_RECIPIENT_WINDOW_SECONDS = float(os.getenv("EMAIL_RECIPIENT_WINDOW_SECONDS", 3600))
+# Sent and failed messages are deleted after this many days
+EMAIL_OUTBOX_RETENTION_DAYS = int(os.getenv("EMAIL_OUTBOX_RETENTION_DAYS", 7))
+EMAIL_PRUNE_INTERVAL_SECONDS = 3600
+
+
+def build_message(row) -> EmailMessage:
+    msg = EmailMessage()
+    msg["Subject"] = row.subject
+    msg["From"] = SENDER_EMAIL
+    msg["To"] = row.to_email
+    if row.text_body:
+        msg.set_content(row.text_body)
+        msg.add_alternative(row.html_body, subtype="html")
+    else:
+        msg.set_content(row.html_body, subtype="html")
+    return msg
+
+
+def is_permanent_failure(error: Exception) -> bool:
+    """
+    5xx replies (unknown mailbox, rejected sender) will not succeed on retry
+    """
+    if isinstance(error, aiosmtplib.SMTPRecipientsRefused):
+        return all(500 <= refused.code < 600 for refused in error.recipients)
+    if isinstance(error, aiosmtplib.SMTPResponseException):
+        return 500 <= error.code < 600
+    return False
+
+
+def retry_delay(attempts: int) -> float:
+    # Exponential backoff with jitter, so a recovering server isn't hit all at once
+    delay = min(EMAIL_RETRY_BASE_SECONDS * 2 ** (attempts - 1), EMAIL_RETRY_MAX_SECONDS)
+    return delay * random.uniform(0.8, 1.2)
+
+
+class SMTPPool:
+    """
+    Up to `size` persistent SMTP connections, reused across messages and batches
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self.opened = 0
+        self._idle: List[tuple] = []  # (client, last_used)
+        self._slots = asyncio.Semaphore(size)
+
+    async def _connect(self) -> aiosmtplib.SMTP:
+        client = aiosmtplib.SMTP(
+            hostname=SMTP_HOST, port=SMTP_PORT,
+            username=SMTP_USERNAME, password=SMTP_PASSWORD,
+            use_tls=SMTP_USE_TLS, timeout=SMTP_TIMEOUT_SECONDS,
+        )
+        await client.connect()
+        self.opened += 1
+        return client
+
+    @asynccontextmanager
+    async def connection(self):
+        async with self._slots:
+            client = None
+            while self._idle and client is None:
+                candidate, last_used = self._idle.pop()
+                if candidate.is_connected and time.monotonic() - last_used < EMAIL_SMTP_IDLE_SECONDS:
+                    client = candidate
+                else:
+                    candidate.close()
+            if client is None:
+                client = await self._connect()
+
+            try:
+                yield client
+            except (aiosmtplib.SMTPResponseException, aiosmtplib.SMTPRecipientsRefused):
+                # The server answered, so the connection itself is still usable
+                self._idle.append((client, time.monotonic()))
+                raise
+            except BaseException:
+                client.close()
+                raise
+            else:
+                self._idle.append((client, time.monotonic()))
+
+    async def close(self):
+        idle, self._idle = self._idle, []
+        for client, _ in idle:
+            try:
+                await client.quit()
+            except Exception:
+                client.close()
+
+    def stats(self) -> dict:
+        return {"size": self.size, "idle": len(self._idle), "opened": self.opened}
+
+
+class RecipientRateLimiter:
+    """
+    Sliding-window cap on messages per recipient, per worker process
+    """
+
+    def __init__(self, limit: int, window: float):
+        self.limit = limit
+        self.window = window
+        self._sent: Dict[str, deque] = {}
+
+    def reserve(self, recipient: str) -> Optional[float]:
+        """
+        Record a send and return None, or return the seconds to wait
+        """
+        now = time.monotonic()
+        key = recipient.lower()
+        sent = self._sent.setdefault(key, deque())
+        while sent and sent[0] <= now - self.window:
+            sent.popleft()
+        if len(sent) >= self.limit:
+            return sent[0] + self.window - now
+        sent.append(now)
+        return None
+
+    def prune(self):
+        cutoff = time.monotonic() - self.window
+        for key in [k for k, sent in self._sent.items() if not sent or sent[-1] <= cutoff]:
+            del self._sent[key]
+
+
+class EmailSender:
+    """
+    Background delivery of the email_outbox table. Workers claim due rows
+    with FOR UPDATE SKIP LOCKED under a lease, send them over pooled SMTP
+    connections, then record each outcome in one bulk UPDATE.
+    """
+
+    def __init__(self, batch_size: int, poll_interval: float):
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.pool = SMTPPool(EMAIL_SMTP_POOL_SIZE)
+        self.limiter = RecipientRateLimiter(EMAIL_RECIPIENT_LIMIT, EMAIL_RECIPIENT_WINDOW_SECONDS)
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.rate_limited = 0
+        self._wakeup = asyncio.Event()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self._last_prune = 0.0
+
+    def notify(self):
+        """
+        Wake the sender after new rows are committed; safe from any thread
+        """
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def _claim(self) -> list:
+        now = datetime.utcnow()
+        due = select(EmailOutbox.email_id).where(
+            EmailOutbox.status == "pending",
+            EmailOutbox.next_attempt_at <= now
+        ).order_by(EmailOutbox.next_attempt_at).limit(self.batch_size).with_for_update(skip_locked=True)
+
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                update(EmailOutbox)
+                .where(EmailOutbox.email_id.in_(due.scalar_subquery()))
+                .values(
+                    attempts=EmailOutbox.attempts + 1,
+                    next_attempt_at=now + timedelta(seconds=EMAIL_LEASE_SECONDS)
+                )
+                .returning(
+                    EmailOutbox.email_id, EmailOutbox.to_email, EmailOutbox.subject,
+                    EmailOutbox.html_body, EmailOutbox.text_body, EmailOutbox.attempts
+                )
+            )
+            rows = result.all()
+            await db.commit()
+        return rows
+
+    async def _deliver(self, row) -> dict:
+        wait = self.limiter.reserve(row.to_email)
+        if wait is not None:
+            # Not a failed attempt; just come back when the window allows
+            self.rate_limited += 1
+            return {
+                "email_id": row.email_id,
+                "attempts": row.attempts - 1,
+                "next_attempt_at": datetime.utcnow() + timedelta(seconds=wait),
+            }
+
+        try:
+            async with self.pool.connection() as smtp:
+                await smtp.send_message(build_message(row))
+        except Exception as e:
+            if is_permanent_failure(e) or row.attempts >= EMAIL_MAX_ATTEMPTS:
+                self.failed += 1
+                print(f"❌ Giving up on email {row.email_id} to {row.to_email}: {e}")
+                return {"email_id": row.email_id, "status": "failed", "last_error": str(e)[:1000]}
+
+            self.retried += 1
+            print(f"⚠️ Email {row.email_id} to {row.to_email} failed, will retry: {e}")
+            return {
+                "email_id": row.email_id,
+                "next_attempt_at": datetime.utcnow() + timedelta(seconds=retry_delay(row.attempts)),
+                "last_error": str(e)[:1000],
+            }
+
+        self.sent += 1
+        return {"email_id": row.email_id, "status": "sent", "sent_at": datetime.utcnow(), "last_error": None}
+
+    async def process_batch(self) -> int:
+        rows = await self._claim()
+        if not rows:
+            return 0
+
+        outcomes = await asyncio.gather(*(self._deliver(row) for row in rows))
+        async with AsyncSessionLocal() as db:
+            # ORM bulk UPDATE by primary key
+            await db.execute(update(EmailOutbox), outcomes)
+            await db.commit()
+        return len(rows)
+
+    async def prune(self) -> int:
+        if EMAIL_OUTBOX_RETENTION_DAYS <= 0:
+            return 0
+        cutoff = datetime.utcnow() - timedelta(days=EMAIL_OUTBOX_RETENTION_DAYS)
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(delete(EmailOutbox).where(
+                EmailOutbox.status.in_(("sent", "failed")),
+                EmailOutbox.created_at < cutoff
+            ))
+            await db.commit()
+        self.limiter.prune()
+        return result.rowcount
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+            try:
+                # Keep draining while batches come back full
+                while not self._stopping and await self.process_batch() >= self.batch_size:
+                    pass
+                if time.monotonic() - self._last_prune >= EMAIL_PRUNE_INTERVAL_SECONDS:
+                    self._last_prune = time.monotonic()
+                    await self.prune()
+            except Exception as e:
+                print(f"❌ Email outbox processing failed: {e}")
+
+    def start(self):
+        if self._task is None:
+            self._stopping = False
+            self._loop = asyncio.get_running_loop()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        # Unsent rows stay in the outbox for the next start
+        self._stopping = True
+        self._wakeup.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+        self._loop = None
+        await self.pool.close()
+
+    def stats(self) -> dict:
+        return {
+            "sent": self.sent,
+            "failed": self.failed,
+            "retried": self.retried,
+            "rate_limited": self.rate_limited,
+            "smtp_pool": self.pool.stats(),
+        }
+
+
+email_sender = EmailSender(batch_size=EMAIL_BATCH_SIZE, poll_interval=EMAIL_POLL_INTERVAL_SECONDS)
@@ -0,0 +1,84 @@
+import os
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterable, Iterator
+from dotenv import load_dotenv
+from jinja2 import Environment, FileSystemLoader, StrictUndefined, Template, select_autoescape
+
+load_dotenv()
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(__file__), "templates", "email")
+FRONTEND_URL = os.getenv("FRONTEND_URL", "http://localhost:3000")
+
+# Each email is a directory holding these three templates
+TEMPLATE_PARTS = ("subject.txt", "body.txt", "body.html")
+
+# auto_reload off: templates are read and compiled once, never stat'ed again
+env = Environment(
+    loader=FileSystemLoader(TEMPLATE_DIR),
+    autoescape=select_autoescape(enabled_extensions=("html",), default_for_string=False),
+    undefined=StrictUndefined,
+    auto_reload=False,
+    cache_size=-1,
+    trim_blocks=True,
+    lstrip_blocks=True,
+)
+env.globals["frontend_url"] = FRONTEND_URL
+
+
+@dataclass(frozen=True)
+class EmailTemplate:
+    name: str
+    subject: Template
+    text: Template
+    html: Template
+
+    def render(self, context: dict) -> dict:
+        return {
+            "subject": " ".join(self.subject.render(context).split()),
+            "text_body": self.text.render(context).strip() + "\n",
+            "html_body": self.html.render(context),
+        }
+
+
+def compile_email_templates() -> Dict[str, EmailTemplate]:
+    templates = {}
+    for name in sorted(os.listdir(TEMPLATE_DIR)):
+        if not os.path.isdir(os.path.join(TEMPLATE_DIR, name)):
+            continue
+        subject, text, html = (env.get_template(f"{name}/{part}") for part in TEMPLATE_PARTS)
+        templates[name] = EmailTemplate(name, subject, text, html)
+    return templates
+
+
+# Compiled at import, i.e. once per process at startup
+EMAIL_TEMPLATES = compile_email_templates()
+
+
+def get_email_template(name: str) -> EmailTemplate:
+    try:
+        return EMAIL_TEMPLATES[name]
+    except KeyError:
+        raise ValueError(f"Unknown email template: {name}")
+
+
+def base_context() -> dict:
+    return {"year": datetime.utcnow().year}
+
+
+def render_email(name: str, **context) -> dict:
+    """
+    Render one email as {subject, text_body, html_body}
+    """
+    return get_email_template(name).render({**base_context(), **context})
+
+
+def render_emails(name: str, contexts: Iterable[dict]) -> Iterator[dict]:
+    """
+    Render the same email for many recipients, lazily; the template lookup
+    and shared context are resolved once for the whole run
+    """
+    template = get_email_template(name)
+    shared = base_context()
+    for context in contexts:
+        yield template.render({**shared, **context})
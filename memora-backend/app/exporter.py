@@ -0,0 +1,142 @@
+import base64
+import csv
+import io
+import json
+import os
+import re
+import zlib
+from typing import Iterator
+from dotenv import load_dotenv
+from sqlalchemy import select, func, literal_column
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+
+from app.database import SessionLocal
+from app.models import Flashcard, FlashcardLink
+
+load_dotenv()
+
+EXPORT_FORMATS = ("csv", "jsonl", "json")
+
+MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "jsonl": "application/x-ndjson",
+    "json": "application/json",
+}
+
+# Rows fetched per server-side cursor round trip; image rows are much larger
+EXPORT_STREAM_BATCH = int(os.getenv("EXPORT_STREAM_BATCH", 500))
+EXPORT_IMAGE_BATCH = int(os.getenv("EXPORT_IMAGE_BATCH", 50))
+# Output is handed to the server in chunks of about this many bytes
+EXPORT_CHUNK_BYTES = 64 * 1024
+
+CARD_FIELDS = (
+    "card_id", "front_text", "back_text", "category", "order_number",
+    "position_x", "position_y", "created_at",
+)
+IMAGE_FIELDS = ("front_image", "back_image")
+
+
+def export_filename(title: str, file_format: str, gzip: bool) -> str:
+    slug = re.sub(r"[^A-Za-z0-9]+", "-", title).strip("-").lower() or "deck"
+    return f"{slug[:64]}.{file_format}" + (".gz" if gzip else "")
+
+
+def card_export_statement(set_id: int, include_links: bool, include_images: bool):
+    """
+    Cards in deck order; outgoing links are aggregated per card in SQL so
+    rows can be written out one at a time
+    """
+    columns = [getattr(Flashcard, field) for field in CARD_FIELDS]
+    if include_links:
+        link = func.json_build_object(
+            "to_card_id", FlashcardLink.to_card_id,
+            "link_type", FlashcardLink.link_type,
+        )
+        columns.append(
+            select(func.coalesce(
+                func.json_agg(aggregate_order_by(link, FlashcardLink.link_id)),
+                literal_column("'[]'::json")
+            )).where(FlashcardLink.from_card_id == Flashcard.card_id)
+            .correlate(Flashcard).scalar_subquery().label("links")
+        )
+    if include_images:
+        columns.extend(getattr(Flashcard, field) for field in IMAGE_FIELDS)
+
+    return select(*columns).where(Flashcard.set_id == set_id).order_by(
+        func.coalesce(Flashcard.order_number, 0), Flashcard.card_id
+    )
+
+
+def export_row_to_dict(row) -> dict:
+    card = dict(row._mapping)
+    card["created_at"] = card["created_at"].isoformat() if card["created_at"] else None
+    for field in IMAGE_FIELDS:
+        if card.get(field) is not None:
+            card[field] = base64.b64encode(card[field]).decode("ascii")
+    return card
+
+
+def iter_export_text(set_info: dict, file_format: str, include_links: bool, include_images: bool) -> Iterator[str]:
+    """
+    Render a set as text pieces straight off a server-side cursor
+    """
+    # Own session: the request-scoped one is closed before streaming starts
+    db = SessionLocal()
+    try:
+        batch = EXPORT_IMAGE_BATCH if include_images else EXPORT_STREAM_BATCH
+        result = db.execute(
+            card_export_statement(set_info["set_id"], include_links, include_images)
+            .execution_options(yield_per=batch)
+        )
+
+        if file_format == "csv":
+            fields = list(CARD_FIELDS) + (["links"] if include_links else []) + (list(IMAGE_FIELDS) if include_images else [])
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(fields)
+            for row in result:
+                card = export_row_to_dict(row)
+                if include_links:
+                    card["links"] = json.dumps(card["links"])
+                writer.writerow([card[field] for field in fields])
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        elif file_format == "jsonl":
+            yield json.dumps({"type": "set", **set_info}) + "\n"
+            for row in result:
+                yield json.dumps({"type": "card", **export_row_to_dict(row)}) + "\n"
+        else:
+            yield json.dumps(set_info)[:-1] + ', "cards": ['
+            first = True
+            for row in result:
+                yield ("" if first else ",") + json.dumps(export_row_to_dict(row))
+                first = False
+            yield "]}"
+    finally:
+        db.close()
+
+
+def iter_export_bytes(pieces: Iterator[str], gzip: bool) -> Iterator[bytes]:
+    """
+    Coalesce small pieces into ~EXPORT_CHUNK_BYTES chunks, gzipping incrementally if asked
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if gzip else None
+    pending = []
+    size = 0
+    for piece in pieces:
+        data = piece.encode("utf-8")
+        pending.append(data)
+        size += len(data)
+        if size >= EXPORT_CHUNK_BYTES:
+            chunk = b"".join(pending)
+            pending, size = [], 0
+            chunk = compressor.compress(chunk) if compressor else chunk
+            if chunk:
+                yield chunk
+
+    chunk = b"".join(pending)
+    if compressor:
+        chunk = compressor.compress(chunk) + compressor.flush()
+    if chunk:
+        yield chunk
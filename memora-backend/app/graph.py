@@ -0,0 +1,177 @@
+import os
+from collections import deque
+from typing import Dict, List, Optional, Set
+from dotenv import load_dotenv
+from sqlalchemy import select, func, true, and_
+from sqlalchemy.orm import Session
+
+from app.cache import TTLCache
+from app.models import Flashcard, FlashcardLink
+
+load_dotenv()
+
+GRAPH_CACHE_SIZE = int(os.getenv("GRAPH_CACHE_SIZE", 256))
+GRAPH_CACHE_TTL_SECONDS = float(os.getenv("GRAPH_CACHE_TTL_SECONDS", 300))
+
+# Work limits for a single traversal request
+GRAPH_MAX_DEPTH = 10
+GRAPH_MAX_VISITED = 10000
+
+# set_id -> (fingerprint, SetGraphIndex)
+graph_cache = TTLCache(maxsize=GRAPH_CACHE_SIZE, ttl=GRAPH_CACHE_TTL_SECONDS)
+
+
+class SetGraphIndex:
+    """
+    In-memory adjacency lists for the cards and links of one set
+    """
+
+    def __init__(self, card_ids: List[int], edges: List[tuple]):
+        self.nodes: List[int] = card_ids
+        self.out_edges: Dict[int, List[int]] = {card_id: [] for card_id in card_ids}
+        self.in_edges: Dict[int, List[int]] = {card_id: [] for card_id in card_ids}
+        for from_id, to_id in edges:
+            self.out_edges[from_id].append(to_id)
+            self.in_edges[to_id].append(from_id)
+
+    def __contains__(self, card_id: int) -> bool:
+        return card_id in self.out_edges
+
+    def _adjacent(self, card_id: int, direction: str):
+        if direction in ("out", "both"):
+            yield from self.out_edges[card_id]
+        if direction in ("in", "both"):
+            yield from self.in_edges[card_id]
+
+    def neighbors(self, card_id: int, depth: int, direction: str, max_visited: int = GRAPH_MAX_VISITED) -> dict:
+        """
+        Breadth-first k-hop neighborhood; returns {card_id: distance}
+        """
+        distances = {card_id: 0}
+        queue = deque([card_id])
+        truncated = False
+        while queue:
+            current = queue.popleft()
+            if distances[current] >= depth:
+                continue
+            for nxt in self._adjacent(current, direction):
+                if nxt in distances:
+                    continue
+                if len(distances) >= max_visited:
+                    truncated = True
+                    queue.clear()
+                    break
+                distances[nxt] = distances[current] + 1
+                queue.append(nxt)
+        return {"distances": distances, "truncated": truncated}
+
+    def shortest_path(self, source: int, target: int, direction: str, max_visited: int = GRAPH_MAX_VISITED) -> dict:
+        """
+        Unweighted shortest path by BFS; path is None when unreachable
+        """
+        parents: Dict[int, Optional[int]] = {source: None}
+        queue = deque([source])
+        truncated = False
+        while queue and target not in parents:
+            current = queue.popleft()
+            for nxt in self._adjacent(current, direction):
+                if nxt in parents:
+                    continue
+                if len(parents) >= max_visited:
+                    truncated = True
+                    queue.clear()
+                    break
+                parents[nxt] = current
+                queue.append(nxt)
+
+        if target not in parents:
+            return {"path": None, "truncated": truncated}
+
+        path = [target]
+        while parents[path[-1]] is not None:
+            path.append(parents[path[-1]])
+        path.reverse()
+        return {"path": path, "truncated": False}
+
+    def components(self) -> List[List[int]]:
+        """
+        Weakly connected components, largest first
+        """
+        seen: Set[int] = set()
+        result = []
+        for start in self.nodes:
+            if start in seen:
+                continue
+            seen.add(start)
+            component = [start]
+            stack = [start]
+            while stack:
+                current = stack.pop()
+                for nxt in self._adjacent(current, "both"):
+                    if nxt not in seen:
+                        seen.add(nxt)
+                        component.append(nxt)
+                        stack.append(nxt)
+            result.append(sorted(component))
+        result.sort(key=lambda c: (-len(c), c[0]))
+        return result
+
+
+def set_link_filter(set_id: int):
+    set_card_ids = select(Flashcard.card_id).where(Flashcard.set_id == set_id)
+    return (
+        FlashcardLink.from_card_id.in_(set_card_ids),
+        FlashcardLink.to_card_id.in_(set_card_ids),
+    )
+
+
+def graph_fingerprint(db: Session, set_id: int) -> tuple:
+    """
+    Cheap change detector: ids only grow, so any card or link added or
+    removed (by this worker or another) changes a count or a max id
+    """
+    cards = select(func.count(Flashcard.card_id), func.max(Flashcard.card_id)).where(
+        Flashcard.set_id == set_id
+    ).subquery()
+    links = select(func.count(FlashcardLink.link_id), func.max(FlashcardLink.link_id)).where(
+        *set_link_filter(set_id)
+    ).subquery()
+    return tuple(db.execute(
+        select(cards, links).select_from(cards.join(links, true()))
+    ).one())
+
+
+def get_set_graph_index(db: Session, set_id: int) -> SetGraphIndex:
+    fingerprint = graph_fingerprint(db, set_id)
+    cached = graph_cache.get(set_id)
+    if cached is not None and cached[0] == fingerprint:
+        return cached[1]
+
+    # Cards with their outgoing in-set links in one statement (one snapshot), so
+    # no edge can point at a card created after the cards were read
+    set_card_ids = select(Flashcard.card_id).where(Flashcard.set_id == set_id).correlate(None)
+    rows = db.execute(
+        select(
+            Flashcard.card_id,
+            func.array_agg(FlashcardLink.to_card_id).filter(FlashcardLink.link_id.isnot(None))
+        ).outerjoin(
+            FlashcardLink, and_(
+                FlashcardLink.from_card_id == Flashcard.card_id,
+                FlashcardLink.to_card_id.in_(set_card_ids)
+            )
+        ).where(
+            Flashcard.set_id == set_id
+        ).group_by(Flashcard.card_id).order_by(Flashcard.card_id)
+    ).all()
+
+    index = SetGraphIndex(
+        [card_id for card_id, _ in rows],
+        [(card_id, to_id) for card_id, targets in rows for to_id in targets or ()]
+    )
+    graph_cache.set(set_id, (fingerprint, index))
+    return index
+
+
+def invalidate_set_graph(*set_ids: int):
+    for set_id in set_ids:
+        graph_cache.pop(set_id)
@@ -0,0 +1,75 @@
+import os
+import re
+from typing import Optional, Tuple
+from dotenv import load_dotenv
+from fastapi import HTTPException
+
+from app.cache import TTLCache
+
+load_dotenv()
+
+IMAGE_CACHE_BYTES = int(os.getenv("IMAGE_CACHE_BYTES", 64 * 1024 * 1024))
+IMAGE_CACHE_TTL_SECONDS = float(os.getenv("IMAGE_CACHE_TTL_SECONDS", 600))
+
+# (card_id, side, etag) -> image bytes; an edit changes the etag, so stale entries just age out
+image_cache = TTLCache(maxsize=IMAGE_CACHE_BYTES, ttl=IMAGE_CACHE_TTL_SECONDS, weigher=len)
+
+IMAGE_SIDES = ("front", "back")
+
+_MAGIC_TYPES = (
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+)
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def sniff_content_type(data: bytes) -> str:
+    for magic, content_type in _MAGIC_TYPES:
+        if data.startswith(magic):
+            return content_type
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    return "application/octet-stream"
+
+
+def make_etag(card_id: int, side: str, updated_at, size: int) -> str:
+    version = int(updated_at.timestamp() * 1000) if updated_at else 0
+    return f'"{card_id}-{side}-{version}-{size}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+def parse_range(range_header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single-range `bytes=` header into an inclusive (start, end).
+    Returns None for absent or multi-range headers (serve the whole body).
+    """
+    if not range_header:
+        return None
+    match = _RANGE_RE.match(range_header.strip())
+    if not match:
+        return None
+
+    first, last = match.groups()
+    if first == "" and last == "":
+        return None
+    if first == "":
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            raise HTTPException(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+        return max(size - length, 0), size - 1
+
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise HTTPException(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+    return start, end
@@ -0,0 +1,301 @@
+import csv
+import io
+import itertools
+import json
+import os
+from datetime import datetime
+from typing import AsyncIterator, Iterator, List, Optional
+import anyio.from_thread
+import psycopg2
+from dotenv import load_dotenv
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal
+from app.models import Flashcard, FlashcardSet, ImportJob
+
+load_dotenv()
+
+# Rows per COPY; also how often progress is written
+IMPORT_CHUNK_ROWS = int(os.getenv("IMPORT_CHUNK_ROWS", 5000))
+IMPORT_MAX_ROWS = int(os.getenv("IMPORT_MAX_ROWS", 500000))
+IMPORT_MAX_ERRORS = 20
+
+# flashcards.order_number is a Postgres integer
+ORDER_NUMBER_MIN = -2 ** 31
+ORDER_NUMBER_MAX = 2 ** 31 - 1
+
+IMPORT_FORMATS = ("csv", "tsv", "jsonl")
+
+# Accepted column / key names for each card field
+FIELD_ALIASES = {
+    "front_text": "front_text", "front": "front_text", "question": "front_text",
+    "back_text": "back_text", "back": "back_text", "answer": "back_text",
+    "category": "category", "tags": "category",
+    "order_number": "order_number", "order": "order_number",
+}
+# Column order when a file has no header row
+POSITIONAL_FIELDS = ("front_text", "back_text", "category", "order_number")
+
+# Values of Anki's '#separator:' header line
+ANKI_SEPARATORS = {"tab": "\t", "comma": ",", "semicolon": ";", "pipe": "|", "space": " "}
+
+COPY_COLUMNS = ("set_id", "front_text", "back_text", "category", "order_number", "created_at", "updated_at")
+
+
+class CardImportError(ValueError):
+    pass
+
+
+class RequestBodyReader(io.RawIOBase):
+    """
+    Blocking file-like view of an async request body for a worker thread
+    started by anyio; each read pulls the next chunk off the event loop
+    """
+
+    def __init__(self, chunks: AsyncIterator[bytes]):
+        self._chunks = chunks
+        self._buffer = b""
+        self.bytes_read = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not self._buffer:
+            try:
+                self._buffer = anyio.from_thread.run(self._chunks.__anext__)
+            except StopAsyncIteration:
+                return 0
+        n = min(len(b), len(self._buffer))
+        b[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+        self.bytes_read += n
+        return n
+
+
+def normalize_record(record: dict) -> dict:
+    card = {}
+    for key, value in record.items():
+        field = FIELD_ALIASES.get(str(key).strip().lower())
+        if field and value not in (None, ""):
+            card[field] = value
+
+    front = str(card.get("front_text", "")).strip()
+    back = str(card.get("back_text", "")).strip()
+    if not front or not back:
+        raise CardImportError("front and back text are required")
+
+    try:
+        order_number = int(card["order_number"]) if "order_number" in card else None
+    except (TypeError, ValueError, OverflowError):
+        raise CardImportError("order must be an integer")
+    if order_number is not None and not ORDER_NUMBER_MIN <= order_number <= ORDER_NUMBER_MAX:
+        raise CardImportError("order is out of range")
+
+    category = card.get("category")
+    # Postgres text can't hold NUL, and COPY would fail the whole import on it
+    if any("\x00" in str(value) for value in (front, back, category) if value is not None):
+        raise CardImportError("text must not contain NUL characters")
+    return {
+        "front_text": front,
+        "back_text": back,
+        "category": str(category).strip() if category is not None else None,
+        "order_number": order_number,
+    }
+
+
+def iter_delimited(text: io.TextIOBase, delimiter: str) -> Iterator[tuple]:
+    """
+    Yield (line_number, record) from CSV/TSV. Anki's leading '#key:value'
+    lines may set the separator and column names; otherwise a first row made
+    of known column names is the header, else columns are positional.
+    """
+    options = {}
+    skipped_lines = 0
+    first = text.readline()
+    while first.startswith("#"):
+        key, _, value = first[1:].rstrip("\r\n").partition(":")
+        options[key.strip().lower()] = value
+        skipped_lines += 1
+        first = text.readline()
+
+    delimiter = ANKI_SEPARATORS.get(options.get("separator", "").strip().lower(), delimiter)
+    header: Optional[List[str]] = None
+    if "columns" in options:
+        header = next(csv.reader([options["columns"]], delimiter=delimiter))
+
+    reader = csv.reader(itertools.chain([first], text), delimiter=delimiter)
+    rows = iter(reader)
+    while True:
+        try:
+            row = next(rows)
+        except StopIteration:
+            return
+        except csv.Error as e:
+            # e.g. a field over csv.field_size_limit(); the reader can't resync after it
+            raise CardImportError(f"line {skipped_lines + reader.line_num}: {e}")
+        if not any(cell.strip() for cell in row):
+            continue
+        if header is None and reader.line_num == 1:
+            if "front_text" in [FIELD_ALIASES.get(cell.strip().lower()) for cell in row]:
+                header = row
+                continue
+        keys = header if header is not None else POSITIONAL_FIELDS
+        yield skipped_lines + reader.line_num, dict(zip(keys, row))
+
+
+def iter_jsonl(text: io.TextIOBase) -> Iterator[tuple]:
+    for line_number, line in enumerate(text, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            yield line_number, None
+            continue
+        yield line_number, record if isinstance(record, dict) else None
+
+
+def iter_records(stream: io.RawIOBase, file_format: str) -> Iterator[tuple]:
+    text = io.TextIOWrapper(io.BufferedReader(stream), encoding="utf-8-sig", newline="")
+    if file_format == "jsonl":
+        return iter_jsonl(text)
+    return iter_delimited(text, "\t" if file_format == "tsv" else ",")
+
+
+def copy_cards(db: Session, set_id: int, cards: List[dict]):
+    """
+    COPY one chunk of cards on the session's own connection, so it is part
+    of the session's transaction
+    """
+    now = datetime.utcnow().isoformat()
+    buffer = io.StringIO()
+    # Every string is quoted; FORCE_NULL turns the "" written for a missing category into NULL
+    writer = csv.writer(buffer, quoting=csv.QUOTE_NONNUMERIC)
+    for card in cards:
+        writer.writerow((
+            set_id, card["front_text"], card["back_text"],
+            card["category"], card["order_number"], now, now,
+        ))
+    buffer.seek(0)
+
+    cursor = db.connection().connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY {Flashcard.__tablename__} ({', '.join(COPY_COLUMNS)}) FROM STDIN WITH (FORMAT csv, FORCE_NULL (category))",
+            buffer,
+        )
+    except psycopg2.DataError as e:
+        # normalize_record should catch bad values first; anything left is still the upload's fault
+        raise CardImportError(f"Invalid card data: {(e.pgerror or str(e)).splitlines()[0]}")
+    finally:
+        cursor.close()
+
+
+def update_job(user_id: int, import_id: str, **fields):
+    """
+    Progress gets its own short transaction so GET /api/sets/import/{import_id}
+    sees it while the import's transaction is still open
+    """
+    db = SessionLocal()
+    try:
+        db.query(ImportJob).filter(
+            ImportJob.user_id == user_id,
+            ImportJob.import_id == import_id
+        ).update({**fields, "updated_at": datetime.utcnow()})
+        db.commit()
+    finally:
+        db.close()
+
+
+def load_cards(db: Session, stream: RequestBodyReader, file_format: str, set_id: int,
+               user_id: int, import_id: str) -> dict:
+    """
+    Parse the upload incrementally and COPY it in chunks; the caller commits
+    """
+    start_order = db.query(func.coalesce(func.max(Flashcard.order_number), 0)).filter(
+        Flashcard.set_id == set_id
+    ).scalar()
+
+    imported = skipped = 0
+    errors = []
+    chunk = []
+    for line_number, record in iter_records(stream, file_format):
+        # JSON-lines exports start with a {"type": "set"} header line
+        if file_format == "jsonl" and isinstance(record, dict) and record.get("type") == "set":
+            continue
+        try:
+            if record is None:
+                raise CardImportError("not a JSON object")
+            if file_format == "jsonl" and record.get("type", "card") != "card":
+                raise CardImportError(f"unsupported record type: {record['type']}")
+            card = normalize_record(record)
+        except CardImportError as e:
+            skipped += 1
+            if len(errors) < IMPORT_MAX_ERRORS:
+                errors.append({"line": line_number, "error": str(e)})
+            continue
+
+        if imported + len(chunk) >= IMPORT_MAX_ROWS:
+            raise CardImportError(f"Imports are limited to {IMPORT_MAX_ROWS} cards")
+        if card["order_number"] is None:
+            card["order_number"] = start_order + imported + len(chunk) + 1
+        chunk.append(card)
+
+        if len(chunk) >= IMPORT_CHUNK_ROWS:
+            copy_cards(db, set_id, chunk)
+            imported += len(chunk)
+            chunk = []
+            update_job(user_id, import_id, rows_imported=imported, rows_skipped=skipped,
+                       bytes_read=stream.bytes_read)
+
+    if chunk:
+        copy_cards(db, set_id, chunk)
+        imported += len(chunk)
+
+    return {"imported": imported, "skipped": skipped, "errors": errors}
+
+
+def import_cards(stream: RequestBodyReader, file_format: str, user_id: int, import_id: str,
+                 set_id: Optional[int] = None, title: Optional[str] = None,
+                 description: Optional[str] = None) -> dict:
+    """
+    Import a whole upload in one transaction: either every parsed card lands
+    (in a new set, or appended to set_id) or none do. Runs in a worker thread.
+    """
+    db = SessionLocal()
+    try:
+        if set_id is not None and not db.query(FlashcardSet.set_id).filter(
+            FlashcardSet.set_id == set_id,
+            FlashcardSet.user_id == user_id
+        ).first():
+            raise LookupError("Set not found")
+
+        # Raises IntegrityError when the import_id was already used
+        db.add(ImportJob(user_id=user_id, import_id=import_id, format=file_format, status="running"))
+        db.commit()
+
+        if set_id is not None:
+            flashcard_set = db.get(FlashcardSet, set_id)
+        else:
+            flashcard_set = FlashcardSet(user_id=user_id, title=title, description=description)
+            db.add(flashcard_set)
+            db.flush()
+
+        try:
+            result = load_cards(db, stream, file_format, flashcard_set.set_id, user_id, import_id)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            update_job(user_id, import_id, status="failed", error=str(e)[:500],
+                       bytes_read=stream.bytes_read)
+            raise
+
+        update_job(user_id, import_id, status="completed", set_id=flashcard_set.set_id,
+                   rows_imported=result["imported"], rows_skipped=result["skipped"],
+                   bytes_read=stream.bytes_read)
+        return {"import_id": import_id, "set_id": flashcard_set.set_id, **result}
+    finally:
+        db.close()
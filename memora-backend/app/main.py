@@ -1,31 +1,97 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, Response, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy import (
+    func, tuple_, select, insert, update, delete, values, column, cast, null, and_,
+    Integer, Float, String, Text, DateTime
+)
 from datetime import timedelta
-from typing import List
-from app.database import engine, get_db, Base
-from app.models import User, FlashcardSet, Flashcard
+from functools import partial
+from typing import List, Optional
+import json
+import uuid
+from types import SimpleNamespace
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import (
+    engine, get_db, get_async_db, Base, SessionLocal, DB_POOL_SAMPLE_INTERVAL_SECONDS, sample_pool_stats
+)
+from app.models import (
+    User, FlashcardSet, Flashcard, ReviewState, ReviewEvent, ImportJob, PasswordResetToken
+)
 from app.schemas import (
     UserCreate, UserLogin, UserResponse, Token,
     FlashcardSetCreate, FlashcardSetResponse,
     FlashcardCreate, FlashcardUpdate, FlashcardResponse, 
+    FlashcardBulkUpdate, FlashcardBulkDelete, SetGraphResponse,
+    ImportResult, ImportJobResponse,
+    ReviewCreate, ReviewStateResponse, StudyCard, StudySyncRequest, StudySyncResponse,
+    SearchResponse,
     PasswordResetRequest, PasswordResetConfirm # Add this
 )
 from app.auth import (
-    get_password_hash, verify_password, create_access_token,
-    get_current_user, ACCESS_TOKEN_EXPIRE_MINUTES
+    hash_password, check_password, create_access_token,
+    get_current_user, invalidate_user_cache, ACCESS_TOKEN_EXPIRE_MINUTES
 )
 from app.models import FlashcardLink
 
 from app import metrics  # Import the metrics router
+from app.metrics_buffer import metrics_buffer
+from app.partitions import PARTITION_MAINTENANCE_INTERVAL_SECONDS, maintain_partitions
+from app.digest import DIGEST_HOUR_UTC, run_daily_digest, seconds_until_next_run
+from app.reset_tokens import (
+    RESET_TOKEN_SWEEP_INTERVAL_SECONDS, hash_reset_token, new_reset_token_row, sweep_expired_reset_tokens
+)
+from app.periodic import run_periodic
+from app.passwords import password_pool
+from app.pagination import encode_cursor, decode_cursor
+from app.scheduler import schedule_from_state
+from app.search import SEARCH_PAGE_MAX, SEARCH_OFFSET_MAX, search_user_cards
+from app.graph import GRAPH_MAX_DEPTH, get_set_graph_index, invalidate_set_graph
+from app.exporter import EXPORT_FORMATS, MEDIA_TYPES, export_filename, iter_export_bytes, iter_export_text
+from app.importer import IMPORT_FORMATS, CardImportError, RequestBodyReader, import_cards
+from app.images import (
+    IMAGE_SIDES, image_cache, make_etag, etag_matches, parse_range, sniff_content_type
+)
 
-from datetime import timedelta, datetime
-from app.email import send_password_reset_email, generate_reset_token  # Add this
+from datetime import timedelta, datetime, timezone
+from app.email import queue_password_reset_email, generate_reset_token
+from app.email_outbox import email_sender
 
 # Create database tables
 Base.metadata.create_all(bind=engine)
 
-app = FastAPI(title="Memora API")
+# Make sure today's and upcoming metrics partitions exist before any insert
+maintain_partitions(engine)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    metrics_buffer.start()
+    email_sender.start()
+    periodic_jobs = [
+        ("Metrics partition maintenance", PARTITION_MAINTENANCE_INTERVAL_SECONDS, partial(maintain_partitions, engine)),
+        ("Reset token sweep", RESET_TOKEN_SWEEP_INTERVAL_SECONDS, partial(sweep_expired_reset_tokens, engine)),
+        ("DB pool sampling", DB_POOL_SAMPLE_INTERVAL_SECONDS, sample_pool_stats),
+    ]
+    if DIGEST_HOUR_UTC >= 0:
+        periodic_jobs.append(
+            ("Daily digest", partial(seconds_until_next_run, DIGEST_HOUR_UTC), partial(run_daily_digest, engine))
+        )
+    periodic_tasks = [asyncio.create_task(run_periodic(*job)) for job in periodic_jobs]
+    yield
+    for task in periodic_tasks:
+        task.cancel()
+    # Flush any buffered metrics before the worker exits
+    await metrics_buffer.stop()
+    await email_sender.stop()
+    password_pool.shutdown()
+
+app = FastAPI(title="Memora API", lifespan=lifespan)
 
 # Configure CORS
 app.add_middleware(
@@ -34,25 +100,25 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "Content-Range", "Content-Disposition"],
 )
 
 # Include metrics router
 app.include_router(metrics.router)
 
-# Auth endpoints
+# Auth endpoints (async: bcrypt runs on the password process pool, not a request thread)
 @app.post("/api/auth/register", response_model=dict)
-def register(user: UserCreate, db: Session = Depends(get_db)):
+async def register(user: UserCreate, db: AsyncSession = Depends(get_async_db)):
     # Check if user exists
-    db_user = db.query(User).filter(User.email == user.email).first()
-    if db_user:
+    result = await db.execute(select(User.user_id).where(User.email == user.email))
+    if result.first():
         raise HTTPException(status_code=400, detail="Email already registered")
     
     # Create new user
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await hash_password(user.password)
     new_user = User(email=user.email, password_hash=hashed_password)
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
     
     # Create access token
     access_token = create_access_token(
@@ -67,11 +133,21 @@ def register(user: UserCreate, db: Session = Depends(get_db)):
     }
 
 @app.post("/api/auth/login", response_model=dict)
-def login(user: UserLogin, db: Session = Depends(get_db)):
-    db_user = db.query(User).filter(User.email == user.email).first()
-    if not db_user or not verify_password(user.password, db_user.password_hash):
+async def login(user: UserLogin, db: AsyncSession = Depends(get_async_db)):
+    result = await db.execute(select(User).where(User.email == user.email))
+    db_user = result.scalars().first()
+    if not db_user:
+        raise HTTPException(status_code=401, detail="Incorrect email or password")
+    
+    valid, new_hash = await check_password(user.password, db_user.password_hash)
+    if not valid:
         raise HTTPException(status_code=401, detail="Incorrect email or password")
     
+    # Stored hash used an old bcrypt cost; upgrade it now that we know the password
+    if new_hash:
+        db_user.password_hash = new_hash
+        await db.commit()
+    
     # Create access token
     access_token = create_access_token(
         data={"sub": db_user.email},
@@ -87,12 +163,15 @@ def login(user: UserLogin, db: Session = Depends(get_db)):
 # Flashcard Set endpoints
 @app.get("/api/sets", response_model=List[FlashcardSetResponse])
 def get_sets(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    sets = db.query(FlashcardSet).filter(FlashcardSet.user_id == current_user.user_id).all()
+    # Fetch sets and their card counts in a single grouped query
+    sets = db.query(FlashcardSet, func.count(Flashcard.card_id)).outerjoin(
+        Flashcard, Flashcard.set_id == FlashcardSet.set_id
+    ).filter(
+        FlashcardSet.user_id == current_user.user_id
+    ).group_by(FlashcardSet.set_id).all()
     
-    # Add card count to each set
     result = []
-    for s in sets:
-        card_count = db.query(Flashcard).filter(Flashcard.set_id == s.set_id).count()
+    for s, card_count in sets:
         set_dict = {
             "set_id": s.set_id,
             "title": s.title,
@@ -142,19 +221,120 @@ def delete_set(
     if not flashcard_set:
         raise HTTPException(status_code=404, detail="Set not found")
     
-    # Delete the set (cascades to delete all cards due to relationship)
+    # Delete the set (the database cascades to its cards and their links)
     db.delete(flashcard_set)
     db.commit()
+    invalidate_set_graph(set_id)
     
     return {"success": True, "message": "Flashcard set deleted"}
 
+# Deck import: registered before the /api/sets/{set_id}/... routes
+@app.post("/api/sets/import", response_model=ImportResult)
+async def import_set(
+    request: Request,
+    file_format: str = Query("csv", alias="format"),
+    set_id: Optional[int] = None,
+    title: Optional[str] = None,
+    description: Optional[str] = None,
+    import_id: Optional[str] = Query(None, min_length=1, max_length=64),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Import cards from a streamed CSV, TSV (including Anki text exports) or
+    JSON-lines body, into set_id or a new set titled `title`. The body is
+    parsed as it arrives and COPY'd in chunks within one transaction; pass
+    your own import_id to poll GET /api/sets/import/{import_id} meanwhile.
+    """
+    if file_format not in IMPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(IMPORT_FORMATS)}")
+    if set_id is None and not title:
+        raise HTTPException(status_code=400, detail="Provide set_id or a title for the new set")
+    
+    stream = RequestBodyReader(request.stream())
+    try:
+        result = await run_in_threadpool(
+            import_cards, stream, file_format, current_user.user_id,
+            import_id or uuid.uuid4().hex, set_id, title, description
+        )
+    except LookupError:
+        raise HTTPException(status_code=404, detail="Set not found")
+    except IntegrityError:
+        raise HTTPException(status_code=409, detail="import_id has already been used")
+    except (CardImportError, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    invalidate_set_graph(result["set_id"])
+    return result
+
+@app.get("/api/sets/import/{import_id}", response_model=ImportJobResponse)
+def get_import_job(
+    import_id: str,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    job = db.query(ImportJob).filter(
+        ImportJob.user_id == current_user.user_id,
+        ImportJob.import_id == import_id
+    ).first()
+    
+    if not job:
+        raise HTTPException(status_code=404, detail="Import not found")
+    
+    return job
+
 # Flashcard endpoints
+
+# Columns served by FlashcardResponse (leaves the image blobs in the table)
+CARD_COLUMNS = (
+    Flashcard.card_id, Flashcard.front_text, Flashcard.back_text, Flashcard.category,
+    Flashcard.order_number, Flashcard.position_x, Flashcard.position_y, Flashcard.created_at
+)
+# Cards without an order_number sort as 0, matching the frontend
+CARD_SORT_KEY = func.coalesce(Flashcard.order_number, 0)
+CARD_PAGE_MAX = 1000
+CARD_STREAM_BATCH = 500
+
+def card_row_to_dict(row):
+    card = dict(row._mapping)
+    card["created_at"] = card["created_at"].isoformat() if card["created_at"] else None
+    return card
+
+def stream_card_rows(statement, stream_format: str):
+    """
+    Yield cards from a server-side cursor as NDJSON or a JSON array
+    """
+    # Own session: the request-scoped one may close before streaming ends
+    db = SessionLocal()
+    try:
+        result = db.execute(statement.execution_options(yield_per=CARD_STREAM_BATCH))
+        if stream_format == "ndjson":
+            for row in result:
+                yield json.dumps(card_row_to_dict(row)) + "\n"
+        else:
+            yield "["
+            first = True
+            for row in result:
+                yield ("" if first else ",") + json.dumps(card_row_to_dict(row))
+                first = False
+            yield "]"
+    finally:
+        db.close()
+
 @app.get("/api/sets/{set_id}/cards", response_model=List[FlashcardResponse])
 def get_cards(
     set_id: int,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=CARD_PAGE_MAX),
+    cursor: Optional[str] = None,
+    stream: Optional[str] = Query(None, pattern="^(ndjson|json)$"),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
+    """
+    Get cards in (order_number, card_id) order. With `limit`, returns one
+    page and sets X-Next-Cursor when more remain; pass it back as `cursor`.
+    With `stream=ndjson|json`, streams rows instead of building a list.
+    """
     # Verify user owns this set
     flashcard_set = db.query(FlashcardSet).filter(
         FlashcardSet.set_id == set_id,
@@ -164,9 +344,68 @@ def get_cards(
     if not flashcard_set:
         raise HTTPException(status_code=404, detail="Set not found")
     
-    cards = db.query(Flashcard).filter(Flashcard.set_id == set_id).all()
+    query = db.query(*CARD_COLUMNS).filter(Flashcard.set_id == set_id)
+    after = decode_cursor(cursor)
+    if after:
+        query = query.filter(tuple_(CARD_SORT_KEY, Flashcard.card_id) > tuple_(*after))
+    query = query.order_by(CARD_SORT_KEY, Flashcard.card_id)
+    
+    if stream:
+        statement = query.limit(limit).statement if limit else query.statement
+        media_type = "application/x-ndjson" if stream == "ndjson" else "application/json"
+        return StreamingResponse(stream_card_rows(statement, stream), media_type=media_type)
+    
+    if limit is None:
+        return query.all()
+    
+    cards = query.limit(limit + 1).all()
+    if len(cards) > limit:
+        cards = cards[:limit]
+        last = cards[-1]
+        response.headers["X-Next-Cursor"] = encode_cursor(last.order_number or 0, last.card_id)
     return cards
 
+@app.get("/api/sets/{set_id}/export")
+def export_set(
+    set_id: int,
+    file_format: str = Query("jsonl", alias="format"),
+    links: bool = True,
+    images: bool = False,
+    gzip: bool = False,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Download a set as CSV, JSON lines or one JSON document, streamed from a
+    server-side cursor. Cards carry their outgoing links (links=true) and,
+    with images=true, base64 images. gzip=true returns a .gz file.
+    """
+    if file_format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(EXPORT_FORMATS)}")
+    
+    # Verify user owns this set
+    flashcard_set = db.query(FlashcardSet).filter(
+        FlashcardSet.set_id == set_id,
+        FlashcardSet.user_id == current_user.user_id
+    ).first()
+    
+    if not flashcard_set:
+        raise HTTPException(status_code=404, detail="Set not found")
+    
+    set_info = {
+        "set_id": flashcard_set.set_id,
+        "title": flashcard_set.title,
+        "description": flashcard_set.description,
+        "created_at": flashcard_set.created_at.isoformat() if flashcard_set.created_at else None,
+    }
+    filename = export_filename(flashcard_set.title, file_format, gzip)
+    body = iter_export_bytes(iter_export_text(set_info, file_format, links, images), gzip)
+    return StreamingResponse(
+        body,
+        media_type="application/gzip" if gzip else MEDIA_TYPES[file_format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
 @app.post("/api/sets/{set_id}/cards", response_model=FlashcardResponse)
 def create_card(
     set_id: int,
@@ -198,6 +437,145 @@ def create_card(
     
     return new_card
 
+# Bulk card endpoints: one ownership check and one statement per request
+CARD_BULK_MAX = 1000
+
+# Fields a bulk update may set, with the SQL type their VALUES column is cast to
+CARD_UPDATE_FIELDS = {
+    "front_text": Text,
+    "back_text": Text,
+    "category": String,
+    "order_number": Integer,
+    "position_x": Float,
+    "position_y": Float,
+}
+
+@app.post("/api/sets/{set_id}/cards/bulk", response_model=List[FlashcardResponse])
+def create_cards_bulk(
+    set_id: int,
+    cards: List[FlashcardCreate],
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Create many cards in one multi-row INSERT
+    """
+    if len(cards) > CARD_BULK_MAX:
+        raise HTTPException(status_code=413, detail=f"At most {CARD_BULK_MAX} cards per request")
+    
+    # Verify user owns this set
+    flashcard_set = db.query(FlashcardSet).filter(
+        FlashcardSet.set_id == set_id,
+        FlashcardSet.user_id == current_user.user_id
+    ).first()
+    
+    if not flashcard_set:
+        raise HTTPException(status_code=404, detail="Set not found")
+    
+    if not cards:
+        return []
+    
+    now = datetime.utcnow()
+    created = db.execute(
+        insert(Flashcard).returning(*CARD_COLUMNS, sort_by_parameter_order=True),
+        [{**card.model_dump(), "set_id": set_id, "created_at": now, "updated_at": now} for card in cards]
+    ).all()
+    db.commit()
+    
+    return created
+
+@app.patch("/api/sets/{set_id}/cards", response_model=List[FlashcardResponse])
+def update_cards_bulk(
+    set_id: int,
+    updates: List[FlashcardBulkUpdate],
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Apply partial updates to many cards with a single UPDATE ... FROM (VALUES ...).
+    Like PUT /api/cards/{card_id}, fields left null keep their current value.
+    """
+    if len(updates) > CARD_BULK_MAX:
+        raise HTTPException(status_code=413, detail=f"At most {CARD_BULK_MAX} cards per request")
+    
+    # Verify user owns this set
+    flashcard_set = db.query(FlashcardSet).filter(
+        FlashcardSet.set_id == set_id,
+        FlashcardSet.user_id == current_user.user_id
+    ).first()
+    
+    if not flashcard_set:
+        raise HTTPException(status_code=404, detail="Set not found")
+    
+    if not updates:
+        return []
+    
+    # Later entries for the same card win
+    by_card = {u.card_id: u for u in updates}
+    
+    rows = values(
+        column("card_id", Integer),
+        *(column(field, sql_type) for field, sql_type in CARD_UPDATE_FIELDS.items()),
+        name="card_updates"
+    ).data([
+        (card_id, *(getattr(u, field) for field in CARD_UPDATE_FIELDS))
+        for card_id, u in by_card.items()
+    ])
+    
+    updated = db.execute(
+        update(Flashcard)
+        .where(Flashcard.card_id == rows.c.card_id, Flashcard.set_id == set_id)
+        .values({
+            field: func.coalesce(cast(rows.c[field], sql_type), getattr(Flashcard, field))
+            for field, sql_type in CARD_UPDATE_FIELDS.items()
+        })
+        .returning(*CARD_COLUMNS)
+        .execution_options(synchronize_session=False)
+    ).all()
+    
+    # All or nothing: every card has to belong to this set
+    missing = set(by_card) - {card.card_id for card in updated}
+    if missing:
+        db.rollback()
+        raise HTTPException(status_code=404, detail=f"Cards not found in set: {sorted(missing)}")
+    
+    db.commit()
+    return updated
+
+@app.delete("/api/sets/{set_id}/cards")
+def delete_cards_bulk(
+    set_id: int,
+    request: FlashcardBulkDelete,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Delete many cards (and their links) in one statement
+    """
+    if len(request.card_ids) > CARD_BULK_MAX:
+        raise HTTPException(status_code=413, detail=f"At most {CARD_BULK_MAX} cards per request")
+    
+    # Verify user owns this set
+    flashcard_set = db.query(FlashcardSet).filter(
+        FlashcardSet.set_id == set_id,
+        FlashcardSet.user_id == current_user.user_id
+    ).first()
+    
+    if not flashcard_set:
+        raise HTTPException(status_code=404, detail="Set not found")
+    
+    # Links go with their cards via ON DELETE CASCADE
+    deleted = db.execute(
+        delete(Flashcard).where(
+            Flashcard.set_id == set_id,
+            Flashcard.card_id.in_(request.card_ids)
+        ).returning(Flashcard.card_id).execution_options(synchronize_session=False)
+    ).scalars().all()
+    db.commit()
+    invalidate_set_graph(set_id)
+    
+    return {"success": True, "deleted": sorted(deleted)}
+
 @app.put("/api/cards/{card_id}", response_model=FlashcardResponse)
 def update_card(
     card_id: int,
@@ -258,9 +636,69 @@ def delete_card(
     
     db.delete(card)
     db.commit()
+    invalidate_set_graph(flashcard_set.set_id)
     
     return {"success": True}
 
+@app.get("/api/cards/{card_id}/image/{side}")
+def get_card_image(
+    card_id: int,
+    side: str,
+    request: Request,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Serve a card's front or back image with ETag revalidation and Range support
+    """
+    if side not in IMAGE_SIDES:
+        raise HTTPException(status_code=404, detail="Image not found")
+    image_column = getattr(Flashcard, f"{side}_image")
+    
+    # Ownership check plus metadata, without reading the blob itself
+    row = db.query(Flashcard.updated_at, func.octet_length(image_column)).join(
+        FlashcardSet, FlashcardSet.set_id == Flashcard.set_id
+    ).filter(
+        Flashcard.card_id == card_id,
+        FlashcardSet.user_id == current_user.user_id
+    ).first()
+    
+    if not row:
+        raise HTTPException(status_code=404, detail="Card not found")
+    
+    updated_at, size = row
+    if size is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+    
+    etag = make_etag(card_id, side, updated_at, size)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache", "Accept-Ranges": "bytes"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    
+    cache_key = (card_id, side, etag)
+    data = image_cache.get(cache_key)
+    if data is None:
+        data = db.query(image_column).filter(Flashcard.card_id == card_id).scalar()
+        if data is None:
+            raise HTTPException(status_code=404, detail="Image not found")
+        data = bytes(data)
+        image_cache.set(cache_key, data)
+    
+    content_type = sniff_content_type(data)
+    
+    # If-Range: only honour the range when the client's copy is current
+    if_range = request.headers.get("if-range")
+    byte_range = None
+    if not if_range or if_range == etag:
+        byte_range = parse_range(request.headers.get("range"), len(data))
+    
+    if byte_range:
+        start, end = byte_range
+        headers["Content-Range"] = f"bytes {start}-{end}/{len(data)}"
+        return Response(content=data[start:end + 1], status_code=206, media_type=content_type, headers=headers)
+    
+    return Response(content=data, media_type=content_type, headers=headers)
+
 @app.get("/")
 def root():
     return {"message": "Memora API is running"}
@@ -331,24 +769,27 @@ def create_card_link(
     if not from_set or not to_set:
         raise HTTPException(status_code=403, detail="Not authorized")
     
-    # Check if link already exists
-    existing_link = db.query(FlashcardLink).filter(
-        FlashcardLink.from_card_id == from_card_id,
-        FlashcardLink.to_card_id == to_card_id
+    # Idempotent insert: the unique (from_card_id, to_card_id) constraint
+    # settles concurrent duplicates, and the existing link is returned instead
+    new_link = db.scalars(
+        pg_insert(FlashcardLink).values(
+            from_card_id=from_card_id,
+            to_card_id=to_card_id,
+            created_at=datetime.utcnow()
+        ).on_conflict_do_nothing(
+            index_elements=["from_card_id", "to_card_id"]
+        ).returning(FlashcardLink)
     ).first()
     
-    if existing_link:
-        return existing_link
+    if new_link is None:
+        new_link = db.query(FlashcardLink).filter(
+            FlashcardLink.from_card_id == from_card_id,
+            FlashcardLink.to_card_id == to_card_id
+        ).first()
     
-    # Create new link
-    new_link = FlashcardLink(
-        from_card_id=from_card_id,
-        to_card_id=to_card_id
-    )
-    
-    db.add(new_link)
     db.commit()
     db.refresh(new_link)
+    invalidate_set_graph(from_card.set_id, to_card.set_id)
     
     return new_link
 
@@ -381,10 +822,402 @@ def delete_card_link(
     
     db.delete(link)
     db.commit()
+    invalidate_set_graph(flashcard_set.set_id)
     
     return {"success": True, "message": "Link deleted successfully"}
 
 
+@app.get("/api/sets/{set_id}/graph", response_model=SetGraphResponse)
+def get_set_graph(
+    set_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Get every card position and every link inside a set for the whiteboard
+    """
+    # Verify user owns this set
+    flashcard_set = db.query(FlashcardSet).filter(
+        FlashcardSet.set_id == set_id,
+        FlashcardSet.user_id == current_user.user_id
+    ).first()
+    
+    if not flashcard_set:
+        raise HTTPException(status_code=404, detail="Set not found")
+    
+    cards = db.query(
+        Flashcard.card_id, Flashcard.order_number, Flashcard.position_x, Flashcard.position_y
+    ).filter(Flashcard.set_id == set_id).order_by(CARD_SORT_KEY, Flashcard.card_id).all()
+    
+    # Links whose both endpoints are in this set
+    set_card_ids = select(Flashcard.card_id).where(Flashcard.set_id == set_id)
+    links = db.query(
+        FlashcardLink.link_id, FlashcardLink.from_card_id, FlashcardLink.to_card_id, FlashcardLink.link_type
+    ).filter(
+        FlashcardLink.from_card_id.in_(set_card_ids),
+        FlashcardLink.to_card_id.in_(set_card_ids)
+    ).order_by(FlashcardLink.link_id).all()
+    
+    return {
+        "set_id": set_id,
+        "cards": {
+            "card_id": [c.card_id for c in cards],
+            "order_number": [c.order_number for c in cards],
+            "position_x": [c.position_x for c in cards],
+            "position_y": [c.position_y for c in cards]
+        },
+        "links": {
+            "link_id": [l.link_id for l in links],
+            "from_card_id": [l.from_card_id for l in links],
+            "to_card_id": [l.to_card_id for l in links],
+            "link_type": [l.link_type for l in links]
+        }
+    }
+
+
+# Graph traversal over a set's links, served from a cached adjacency index
+@app.get("/api/sets/{set_id}/graph/neighbors")
+def get_card_neighbors(
+    set_id: int,
+    card_id: int,
+    depth: int = Query(1, ge=1, le=GRAPH_MAX_DEPTH),
+    direction: str = Query("both", pattern="^(out|in|both)$"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Get every card within `depth` links of a card
+    """
+    # Verify user owns this set
+    flashcard_set = db.query(FlashcardSet).filter(
+        FlashcardSet.set_id == set_id,
+        FlashcardSet.user_id == current_user.user_id
+    ).first()
+    
+    if not flashcard_set:
+        raise HTTPException(status_code=404, detail="Set not found")
+    
+    graph = get_set_graph_index(db, set_id)
+    if card_id not in graph:
+        raise HTTPException(status_code=404, detail="Card not found")
+    
+    result = graph.neighbors(card_id, depth, direction)
+    return {
+        "card_id": card_id,
+        "depth": depth,
+        "direction": direction,
+        "nodes": [
+            {"card_id": node, "distance": distance}
+            for node, distance in result["distances"].items()
+        ],
+        "truncated": result["truncated"]
+    }
+
+@app.get("/api/sets/{set_id}/graph/path")
+def get_card_path(
+    set_id: int,
+    from_card_id: int,
+    to_card_id: int,
+    direction: str = Query("out", pattern="^(out|in|both)$"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Get the shortest chain of links between two cards
+    """
+    # Verify user owns this set
+    flashcard_set = db.query(FlashcardSet).filter(
+        FlashcardSet.set_id == set_id,
+        FlashcardSet.user_id == current_user.user_id
+    ).first()
+    
+    if not flashcard_set:
+        raise HTTPException(status_code=404, detail="Set not found")
+    
+    graph = get_set_graph_index(db, set_id)
+    if from_card_id not in graph or to_card_id not in graph:
+        raise HTTPException(status_code=404, detail="Card not found")
+    
+    result = graph.shortest_path(from_card_id, to_card_id, direction)
+    return {
+        "from_card_id": from_card_id,
+        "to_card_id": to_card_id,
+        "path": result["path"],
+        "length": len(result["path"]) - 1 if result["path"] else None,
+        "truncated": result["truncated"]
+    }
+
+@app.get("/api/sets/{set_id}/graph/components")
+def get_graph_components(
+    set_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Get the connected groups of cards in a set, ignoring link direction
+    """
+    # Verify user owns this set
+    flashcard_set = db.query(FlashcardSet).filter(
+        FlashcardSet.set_id == set_id,
+        FlashcardSet.user_id == current_user.user_id
+    ).first()
+    
+    if not flashcard_set:
+        raise HTTPException(status_code=404, detail="Set not found")
+    
+    components = get_set_graph_index(db, set_id).components()
+    return {"set_id": set_id, "count": len(components), "components": components}
+
+
+# Spaced-repetition endpoints
+STUDY_NEXT_MAX = 200
+STUDY_SYNC_MAX_EVENTS = 1000
+
+REVIEW_STATE_FIELDS = (
+    "due_at", "interval_days", "ease", "repetitions", "lapses", "last_grade", "last_reviewed_at"
+)
+
+def review_time(reviewed_at: Optional[datetime]) -> datetime:
+    """
+    Client review timestamp as naive UTC, never later than now
+    """
+    now = datetime.utcnow()
+    if reviewed_at is None:
+        return now
+    if reviewed_at.tzinfo is not None:
+        reviewed_at = reviewed_at.astimezone(timezone.utc).replace(tzinfo=None)
+    return min(reviewed_at, now)
+
+def query_next_study_cards(db: Session, user_id: int, limit: int, set_id: Optional[int], include_new: bool):
+    """
+    Up to `limit` due cards, most overdue first, then never-reviewed cards
+    """
+    now = datetime.utcnow()
+    
+    # Due cards come straight off the (user_id, due_at) index
+    due_query = db.query(*CARD_COLUMNS, Flashcard.set_id, ReviewState.due_at).join(
+        ReviewState, ReviewState.card_id == Flashcard.card_id
+    ).filter(
+        ReviewState.user_id == user_id,
+        ReviewState.due_at <= now
+    )
+    if set_id is not None:
+        due_query = due_query.filter(Flashcard.set_id == set_id)
+    cards = due_query.order_by(ReviewState.due_at).limit(limit).all()
+    
+    if include_new and len(cards) < limit:
+        new_query = db.query(
+            *CARD_COLUMNS, Flashcard.set_id, cast(null(), DateTime).label("due_at")
+        ).join(
+            FlashcardSet, FlashcardSet.set_id == Flashcard.set_id
+        ).outerjoin(
+            ReviewState, and_(
+                ReviewState.card_id == Flashcard.card_id,
+                ReviewState.user_id == user_id
+            )
+        ).filter(
+            FlashcardSet.user_id == user_id,
+            ReviewState.card_id.is_(None)
+        )
+        if set_id is not None:
+            new_query = new_query.filter(Flashcard.set_id == set_id)
+        cards += new_query.order_by(
+            Flashcard.set_id, CARD_SORT_KEY, Flashcard.card_id
+        ).limit(limit - len(cards)).all()
+    
+    return cards
+
+@app.post("/api/reviews", response_model=ReviewStateResponse)
+def create_review(
+    review: ReviewCreate,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Record a grade for a card and reschedule it
+    """
+    # Verify user owns this card's set
+    card = db.query(Flashcard.card_id).join(
+        FlashcardSet, FlashcardSet.set_id == Flashcard.set_id
+    ).filter(
+        Flashcard.card_id == review.card_id,
+        FlashcardSet.user_id == current_user.user_id
+    ).first()
+    
+    if not card:
+        raise HTTPException(status_code=404, detail="Card not found")
+    
+    state = db.query(ReviewState).filter(
+        ReviewState.user_id == current_user.user_id,
+        ReviewState.card_id == review.card_id
+    ).with_for_update().first()
+    
+    reviewed_at = review_time(review.reviewed_at)
+    schedule = schedule_from_state(state, review.grade, reviewed_at)
+    
+    # FOR UPDATE locks nothing for a first review, so a concurrent one may
+    # insert the row first; upsert like /api/study/sync does
+    upsert = pg_insert(ReviewState).values(
+        user_id=current_user.user_id,
+        card_id=review.card_id,
+        due_at=schedule.due_at,
+        interval_days=schedule.interval_days,
+        ease=schedule.ease,
+        repetitions=schedule.repetitions,
+        lapses=schedule.lapses,
+        last_grade=review.grade,
+        last_reviewed_at=reviewed_at
+    )
+    state = db.execute(
+        upsert.on_conflict_do_update(
+            index_elements=["user_id", "card_id"],
+            set_={
+                field: upsert.excluded[field]
+                for field in REVIEW_STATE_FIELDS
+            }
+        ).returning(ReviewState),
+        execution_options={"populate_existing": True}
+    ).scalar_one()
+    
+    db.commit()
+    
+    return state
+
+@app.get("/api/study/next", response_model=List[StudyCard])
+def get_next_study_cards(
+    limit: int = Query(20, ge=1, le=STUDY_NEXT_MAX),
+    set_id: Optional[int] = None,
+    include_new: bool = True,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Get up to `limit` cards that are due, most overdue first, topped up
+    with never-reviewed cards when include_new is set
+    """
+    return query_next_study_cards(db, current_user.user_id, limit, set_id, include_new)
+
+@app.post("/api/study/sync", response_model=StudySyncResponse)
+def sync_study_session(
+    sync: StudySyncRequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Apply a batch of offline review events in one transaction. Events are
+    idempotent by event_id, so a client can safely resend a batch.
+    """
+    if len(sync.events) > STUDY_SYNC_MAX_EVENTS:
+        raise HTTPException(status_code=413, detail=f"At most {STUDY_SYNC_MAX_EVENTS} events per sync")
+    
+    # First occurrence of each event id wins within a batch
+    events = {}
+    for event in sync.events:
+        events.setdefault(event.event_id, event)
+    
+    # One query for ownership of every referenced card
+    card_ids = {event.card_id for event in events.values()}
+    owned = set(db.execute(
+        select(Flashcard.card_id).join(
+            FlashcardSet, FlashcardSet.set_id == Flashcard.set_id
+        ).where(
+            Flashcard.card_id.in_(card_ids),
+            FlashcardSet.user_id == current_user.user_id
+        )
+    ).scalars().all()) if card_ids else set()
+    
+    rejected = [event_id for event_id, event in events.items() if event.card_id not in owned]
+    accepted = [event for event in events.values() if event.card_id in owned]
+    
+    # Record event ids; only ids not seen before come back and get applied
+    new_ids = set()
+    if accepted:
+        new_ids = set(db.execute(
+            pg_insert(ReviewEvent).values([
+                {
+                    "user_id": current_user.user_id,
+                    "event_id": event.event_id,
+                    "card_id": event.card_id,
+                    "grade": event.grade,
+                    "reviewed_at": review_time(event.reviewed_at)
+                }
+                for event in accepted
+            ]).on_conflict_do_nothing().returning(ReviewEvent.event_id)
+        ).scalars().all())
+    
+    duplicates = [event.event_id for event in accepted if event.event_id not in new_ids]
+    to_apply = sorted(
+        (event for event in accepted if event.event_id in new_ids),
+        key=lambda event: (review_time(event.reviewed_at), event.event_id)
+    )
+    
+    if to_apply:
+        # Lock and load current state for every touched card at once
+        states = {
+            state.card_id: state
+            for state in db.query(ReviewState).filter(
+                ReviewState.user_id == current_user.user_id,
+                ReviewState.card_id.in_({event.card_id for event in to_apply})
+            ).with_for_update().all()
+        }
+        
+        # Replay events per card in review order
+        updated = {}
+        for event in to_apply:
+            reviewed_at = review_time(event.reviewed_at)
+            schedule = schedule_from_state(
+                updated.get(event.card_id) or states.get(event.card_id), event.grade, reviewed_at
+            )
+            updated[event.card_id] = SimpleNamespace(
+                user_id=current_user.user_id,
+                card_id=event.card_id,
+                due_at=schedule.due_at,
+                interval_days=schedule.interval_days,
+                ease=schedule.ease,
+                repetitions=schedule.repetitions,
+                lapses=schedule.lapses,
+                last_grade=event.grade,
+                last_reviewed_at=reviewed_at
+            )
+        
+        upsert = pg_insert(ReviewState).values([vars(state) for state in updated.values()])
+        db.execute(upsert.on_conflict_do_update(
+            index_elements=["user_id", "card_id"],
+            set_={
+                field: upsert.excluded[field]
+                for field in REVIEW_STATE_FIELDS
+            }
+        ))
+    
+    db.commit()
+    
+    return {
+        "applied": len(to_apply),
+        "duplicate_event_ids": duplicates,
+        "rejected_event_ids": rejected,
+        "due_cards": query_next_study_cards(
+            db, current_user.user_id, sync.limit, sync.set_id, include_new=True
+        ) if sync.limit else []
+    }
+
+
+# Full-text search across the user's cards
+@app.get("/api/search", response_model=SearchResponse)
+def search_cards(
+    q: str = Query(..., min_length=1, max_length=200),
+    set_id: Optional[int] = None,
+    limit: int = Query(20, ge=1, le=SEARCH_PAGE_MAX),
+    offset: int = Query(0, ge=0, le=SEARCH_OFFSET_MAX),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Search card text and categories (web-search syntax: "phrases", -exclude, or).
+    Results are ranked, paginated, and carry highlighted snippets.
+    """
+    return search_user_cards(db, current_user.user_id, q, set_id, limit, offset)
+
+
 # Password Reset endpoints
 @app.post("/api/auth/forgot-password")
 def forgot_password(request: PasswordResetRequest, db: Session = Depends(get_db)):
@@ -398,42 +1231,45 @@ def forgot_password(request: PasswordResetRequest, db: Session = Depends(get_db)
     if not user:
         return {"success": True, "message": "If that email exists, a reset link has been sent"}
     
-    # Generate reset token
+    # Generate reset token; only its hash is stored
     reset_token = generate_reset_token()
-    user.reset_token = reset_token
-    user.reset_token_expires = datetime.utcnow() + timedelta(hours=1)
+    db.add(new_reset_token_row(user.user_id, reset_token))
     
+    # Queued in the same transaction as the token; the email sender delivers it
+    queue_password_reset_email(db, user.email, reset_token)
     db.commit()
     
-    # Send email
-    email_sent = send_password_reset_email(user.email, reset_token)
-    
-    if not email_sent:
-        raise HTTPException(status_code=500, detail="Failed to send reset email")
-    
     return {"success": True, "message": "If that email exists, a reset link has been sent"}
 
 @app.post("/api/auth/reset-password")
-def reset_password(request: PasswordResetConfirm, db: Session = Depends(get_db)):
+async def reset_password(request: PasswordResetConfirm, db: AsyncSession = Depends(get_async_db)):
     """
     Reset password using token from email
     """
-    # Find user with this token
-    user = db.query(User).filter(User.reset_token == request.token).first()
+    # Consume the token: deleting it makes it single-use even under concurrent requests
+    result = await db.execute(
+        delete(PasswordResetToken)
+        .where(PasswordResetToken.token_hash == hash_reset_token(request.token))
+        .returning(PasswordResetToken.user_id, PasswordResetToken.expires_at)
+    )
+    token = result.first()
     
-    if not user:
+    if not token:
         raise HTTPException(status_code=400, detail="Invalid or expired reset token")
     
     # Check if token is expired
-    if user.reset_token_expires < datetime.utcnow():
+    if token.expires_at < datetime.utcnow():
+        await db.commit()
         raise HTTPException(status_code=400, detail="Reset token has expired")
     
-    # Update password
-    user.password_hash = get_password_hash(request.new_password)
-    user.reset_token = None
-    user.reset_token_expires = None
+    user = await db.get(User, token.user_id)
     
-    db.commit()
+    # Update password; any other outstanding tokens for this user are revoked too
+    user.password_hash = await hash_password(request.new_password)
+    await db.execute(delete(PasswordResetToken).where(PasswordResetToken.user_id == user.user_id))
+    
+    await db.commit()
+    invalidate_user_cache(user.email)
     
     return {"success": True, "message": "Password has been reset successfully"}
 
@@ -442,9 +1278,14 @@ def verify_reset_token(token: str, db: Session = Depends(get_db)):
     """
     Verify if a reset token is valid
     """
-    user = db.query(User).filter(User.reset_token == token).first()
+    user = db.query(User).join(
+        PasswordResetToken, PasswordResetToken.user_id == User.user_id
+    ).filter(
+        PasswordResetToken.token_hash == hash_reset_token(token),
+        PasswordResetToken.expires_at >= datetime.utcnow()
+    ).first()
     
-    if not user or user.reset_token_expires < datetime.utcnow():
+    if not user:
         raise HTTPException(status_code=400, detail="Invalid or expired reset token")
     
     return {"valid": True, "email": user.email}
@@ -1,134 +1,140 @@
 from fastapi import APIRouter, HTTPException, Depends
-from sqlalchemy.orm import Session
-from sqlalchemy import func, cast, Float as SQLFloat
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, func, cast, Float as SQLFloat
 from datetime import datetime, timedelta
-from typing import List, Dict
-from app.database import get_db
+from typing import List, Dict, Optional
+from app.database import get_async_db, get_pool_stats
 from app.models import Metric, User
 from app.schemas import MetricCreate, MetricResponse, MetricsDashboard, UptimeStatus
-from app.auth import get_current_user
+from app.auth import get_current_user, get_user_cache_stats
+from app.metrics_buffer import metrics_buffer, MetricsBufferFull
+from app.images import image_cache
+from app.graph import graph_cache
+from app.passwords import password_pool
+from app.email_outbox import email_sender
+from app.rollups import rollup_totals, rollup_sketches, combine_totals, count_active_users
 
 router = APIRouter(prefix="/api/metrics", tags=["metrics"])
 
-# Store metrics endpoint
-@router.post("/", response_model=dict)
+METRICS_BATCH_MAX_EVENTS = 500
+
+LATENCY_PERCENTILES = {"p50": 0.5, "p95": 0.95, "p99": 0.99}
+
+# Queries on the raw metrics table; tests/test_metrics_indexes.py checks their plans
+def metrics_by_type_query(metric_type: str, since: datetime):
+    # Uses ix_metrics_type_created_at
+    return select(Metric).where(
+        Metric.type == metric_type,
+        Metric.created_at > since
+    ).order_by(Metric.created_at.desc()).limit(1000)
+
+def user_activity_query(user_id: int, since: datetime):
+    # Count the user's actions per type in SQL; uses ix_metrics_user_id_created_at
+    return select(Metric.type, func.count(Metric.metric_id)).where(
+        Metric.user_id == user_id,
+        Metric.created_at > since
+    ).group_by(Metric.type)
+
+def enqueue_metrics(user_id: Optional[int], metrics: List[MetricCreate]):
+    if len(metrics) > METRICS_BATCH_MAX_EVENTS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch exceeds {METRICS_BATCH_MAX_EVENTS} events"
+        )
+    
+    try:
+        accepted = metrics_buffer.add(user_id, metrics)
+    except MetricsBufferFull:
+        raise HTTPException(
+            status_code=503,
+            detail="Metrics buffer is full, retry later",
+            headers={"Retry-After": "1"}
+        )
+    
+    return {"success": True, "accepted": accepted}
+
+# Store metrics endpoint; single events share the batch path, so rollups
+# are applied once per flush instead of once per request
+@router.post("/", response_model=dict, status_code=202)
 async def store_metric(
     metric: MetricCreate, 
-    db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """
-    Store a metric in the database
+    Queue a metric for the current user
     """
-    try:
-        new_metric = Metric(
-            user_id=current_user.user_id,
-            type=metric.type,
-            data=metric.data,
-            created_at=datetime.utcnow()
-        )
-        
-        db.add(new_metric)
-        db.commit()
-        db.refresh(new_metric)
-        
-        return {"success": True, "metric_id": new_metric.metric_id}
-    
-    except Exception as e:
-        db.rollback()
-        raise HTTPException(status_code=500, detail=f"Failed to store metric: {str(e)}")
+    return enqueue_metrics(current_user.user_id, [metric])
 
 # Public endpoint for storing metrics (no auth required for better reliability)
-@router.post("/public", response_model=dict)
-async def store_metric_public(
-    metric: MetricCreate, 
-    db: Session = Depends(get_db)
+@router.post("/public", response_model=dict, status_code=202)
+async def store_metric_public(metric: MetricCreate):
+    """
+    Queue a metric without authentication (for page loads, errors before login, etc.)
+    """
+    return enqueue_metrics(None, [metric])
+
+# Batched metrics endpoint; rows are buffered and flushed in bulk
+@router.post("/batch", response_model=dict, status_code=202)
+async def store_metrics_batch(
+    metrics: List[MetricCreate],
+    current_user: User = Depends(get_current_user)
 ):
     """
-    Store a metric without authentication (for page loads, errors before login, etc.)
+    Queue a batch of metrics for the current user
     """
-    try:
-        new_metric = Metric(
-            user_id=None,  # No user associated
-            type=metric.type,
-            data=metric.data,
-            created_at=datetime.utcnow()
-        )
-        
-        db.add(new_metric)
-        db.commit()
-        db.refresh(new_metric)
-        
-        return {"success": True, "metric_id": new_metric.metric_id}
-    
-    except Exception as e:
-        db.rollback()
-        raise HTTPException(status_code=500, detail=f"Failed to store metric: {str(e)}")
+    return enqueue_metrics(current_user.user_id, metrics)
+
+@router.post("/public/batch", response_model=dict, status_code=202)
+async def store_metrics_batch_public(metrics: List[MetricCreate]):
+    """
+    Queue a batch of metrics without authentication
+    """
+    return enqueue_metrics(None, metrics)
 
 # Get metrics dashboard
 @router.get("/dashboard", response_model=MetricsDashboard)
-async def get_metrics_dashboard(db: Session = Depends(get_db)):
+async def get_metrics_dashboard(db: AsyncSession = Depends(get_async_db)):
     """
     Get aggregated metrics for dashboard
     """
     try:
-        # Average page load time (last 7 days)
+        # All figures come from the pre-aggregated rollup tables
         seven_days_ago = datetime.utcnow() - timedelta(days=7)
+        one_hour_ago = datetime.utcnow() - timedelta(hours=1)
+        thirty_days_ago = datetime.utcnow() - timedelta(days=30)
+        twenty_four_hours_ago = datetime.utcnow() - timedelta(hours=24)
         
-        page_load_metrics = db.query(Metric).filter(
-            Metric.type == 'page_load',
-            Metric.created_at > seven_days_ago
-        ).all()
-        
-        avg_page_load = 0
-        if page_load_metrics:
-            durations = [float(m.data.get('duration', 0)) for m in page_load_metrics]
-            avg_page_load = sum(durations) / len(durations) if durations else 0
+        # Average page load time (last 7 days)
+        count, total = combine_totals(await rollup_totals(db, ['page_load'], seven_days_ago))
+        avg_page_load = total / count if count else 0
         
         # Error rate (last hour)
-        one_hour_ago = datetime.utcnow() - timedelta(hours=1)
-        error_count = db.query(func.count(Metric.metric_id)).filter(
-            Metric.type == 'error',
-            Metric.created_at > one_hour_ago
-        ).scalar() or 0
+        error_count, _ = combine_totals(await rollup_totals(db, ['error'], one_hour_ago))
         
-        # Weekly active users (count distinct user_ids)
-        active_users_count = db.query(func.count(func.distinct(Metric.user_id))).filter(
-            Metric.type == 'user_activity',
-            Metric.created_at > seven_days_ago,
-            Metric.user_id.isnot(None)
-        ).scalar() or 0
+        # Weekly active users (distinct users with activity)
+        active_users_count = await count_active_users(db, seven_days_ago)
         
         # Average satisfaction (last 30 days)
-        thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-        satisfaction_metrics = db.query(Metric).filter(
-            Metric.type == 'satisfaction',
-            Metric.created_at > thirty_days_ago
-        ).all()
-        
-        avg_satisfaction = 0
-        if satisfaction_metrics:
-            ratings = [float(m.data.get('rating', 0)) for m in satisfaction_metrics]
-            avg_satisfaction = sum(ratings) / len(ratings) if ratings else 0
+        count, total = combine_totals(await rollup_totals(db, ['satisfaction'], thirty_days_ago))
+        avg_satisfaction = total / count if count else 0
         
         # Average latency by action (last 24 hours)
-        twenty_four_hours_ago = datetime.utcnow() - timedelta(hours=24)
-        latency_metrics = db.query(Metric).filter(
-            Metric.type == 'latency',
-            Metric.created_at > twenty_four_hours_ago
-        ).all()
-        
-        latency_by_action = {}
-        for metric in latency_metrics:
-            action = metric.data.get('action')
-            duration = float(metric.data.get('duration', 0))
-            if action not in latency_by_action:
-                latency_by_action[action] = []
-            latency_by_action[action].append(duration)
-        
+        latency_by_action = await rollup_totals(db, ['latency'], twenty_four_hours_ago)
         avg_latency = {
-            action: round(sum(durations) / len(durations), 2)
-            for action, durations in latency_by_action.items()
+            action: round(total / count, 2)
+            for action, (count, total) in latency_by_action.items()
+            if action and count
+        }
+        
+        # Tail latency by action (last 24 hours), merged from per-bucket sketches
+        latency_sketches = await rollup_sketches(db, ['latency'], twenty_four_hours_ago)
+        latency_percentiles = {
+            action: {
+                name: round(sketch.quantile(q), 2)
+                for name, q in LATENCY_PERCENTILES.items()
+            }
+            for action, sketch in latency_sketches.items()
+            if action and sketch.count
         }
         
         return MetricsDashboard(
@@ -137,6 +143,7 @@ async def get_metrics_dashboard(db: Session = Depends(get_db)):
             weeklyActiveUsers=active_users_count,
             avgSatisfaction=round(avg_satisfaction, 2),
             avgLatency=avg_latency,
+            latencyPercentiles=latency_percentiles,
             period={
                 "pageLoad": "7 days",
                 "errors": "1 hour",
@@ -154,7 +161,7 @@ async def get_metrics_dashboard(db: Session = Depends(get_db)):
 async def get_metrics_by_type(
     metric_type: str,
     days: int = 7,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Get detailed metrics filtered by type and time period
@@ -162,10 +169,7 @@ async def get_metrics_by_type(
     try:
         start_date = datetime.utcnow() - timedelta(days=days)
         
-        metrics = db.query(Metric).filter(
-            Metric.type == metric_type,
-            Metric.created_at > start_date
-        ).order_by(Metric.created_at.desc()).limit(1000).all()
+        metrics = (await db.execute(metrics_by_type_query(metric_type, start_date))).scalars().all()
         
         return {
             "type": metric_type,
@@ -186,7 +190,7 @@ async def get_metrics_by_type(
 
 # Get uptime status
 @router.get("/uptime/status", response_model=UptimeStatus)
-async def get_uptime_status(db: Session = Depends(get_db)):
+async def get_uptime_status(db: AsyncSession = Depends(get_async_db)):
     """
     Calculate uptime percentage based on error logs
     """
@@ -195,16 +199,14 @@ async def get_uptime_status(db: Session = Depends(get_db)):
         twenty_four_hours_ago = datetime.utcnow() - timedelta(hours=24)
         
         # Count successful requests (page loads + successful API calls)
-        total_requests = db.query(func.count(Metric.metric_id)).filter(
-            Metric.type.in_(['page_load', 'latency']),
-            Metric.created_at > twenty_four_hours_ago
-        ).scalar() or 0
+        total_requests, _ = combine_totals(
+            await rollup_totals(db, ['page_load', 'latency'], twenty_four_hours_ago)
+        )
         
         # Count failed requests
-        failed_requests = db.query(func.count(Metric.metric_id)).filter(
-            Metric.type == 'error',
-            Metric.created_at > twenty_four_hours_ago
-        ).scalar() or 0
+        failed_requests, _ = combine_totals(
+            await rollup_totals(db, ['error'], twenty_four_hours_ago)
+        )
         
         uptime_percentage = 100.0
         if total_requests > 0:
@@ -224,7 +226,7 @@ async def get_uptime_status(db: Session = Depends(get_db)):
 @router.get("/user/activity", response_model=Dict)
 async def get_user_metrics(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Get metrics for the current user
@@ -232,26 +234,41 @@ async def get_user_metrics(
     try:
         seven_days_ago = datetime.utcnow() - timedelta(days=7)
         
-        # Count user's actions
-        user_metrics = db.query(Metric).filter(
-            Metric.user_id == current_user.user_id,
-            Metric.created_at > seven_days_ago
-        ).all()
-        
-        # Group by type
-        metrics_by_type = {}
-        for metric in user_metrics:
-            if metric.type not in metrics_by_type:
-                metrics_by_type[metric.type] = 0
-            metrics_by_type[metric.type] += 1
+        result = await db.execute(user_activity_query(current_user.user_id, seven_days_ago))
+        metrics_by_type = dict(result.all())
         
         return {
             "user_id": current_user.user_id,
             "email": current_user.email,
             "period": "7 days",
-            "total_actions": len(user_metrics),
+            "total_actions": sum(metrics_by_type.values()),
             "actions_by_type": metrics_by_type
         }
     
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to fetch user metrics: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Failed to fetch user metrics: {str(e)}")
+
+# Get in-process cache statistics
+@router.get("/cache/stats", response_model=Dict)
+async def get_cache_stats():
+    """
+    Hit/miss counters for the in-process caches, metrics buffer depth,
+    password pool load and email delivery counters
+    """
+    return {
+        "user_cache": get_user_cache_stats(),
+        "image_cache": image_cache.stats(),
+        "graph_cache": graph_cache.stats(),
+        "metrics_buffer": metrics_buffer.stats(),
+        "password_pool": password_pool.stats(),
+        "email_sender": email_sender.stats()
+    }
+
+# Get database connection pool statistics
+@router.get("/db/pool", response_model=Dict)
+async def get_db_pool_stats():
+    """
+    Live pool usage per engine (sync and async); the wait_ms_* percentiles
+    cover checkouts since the last 'db_pool' metric sample
+    """
+    return get_pool_stats()
\ No newline at end of file
@@ -0,0 +1,157 @@
+import asyncio
+import os
+from datetime import datetime
+from typing import List, Optional
+from dotenv import load_dotenv
+from sqlalchemy import exc, insert
+
+from app.database import AsyncSessionLocal
+from app.models import Metric
+from app.rollups import apply_rollups
+
+load_dotenv()
+
+METRICS_BUFFER_MAX_ROWS = int(os.getenv("METRICS_BUFFER_MAX_ROWS", 50000))
+METRICS_FLUSH_ROWS = int(os.getenv("METRICS_FLUSH_ROWS", 1000))
+METRICS_FLUSH_INTERVAL_SECONDS = float(os.getenv("METRICS_FLUSH_INTERVAL_SECONDS", 2))
+
+
+class MetricsBufferFull(Exception):
+    pass
+
+
+def is_transient_error(error: Exception) -> bool:
+    """
+    Connection / timeout failures; anything else is blamed on the rows
+    """
+    if isinstance(error, exc.DBAPIError) and error.connection_invalidated:
+        return True
+    return isinstance(error, (exc.OperationalError, exc.InterfaceError, exc.TimeoutError, OSError, asyncio.TimeoutError))
+
+
+class MetricsBuffer:
+    """
+    In-memory queue of metric rows, flushed to the metrics table with
+    multi-row INSERTs when it reaches flush_rows or every flush_interval
+    """
+
+    def __init__(self, max_rows: int, flush_rows: int, flush_interval: float):
+        self.max_rows = max_rows
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.flushed = 0
+        self.rejected = 0
+        self.dropped = 0
+        self.invalid = 0
+        self._rows = []
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    def __len__(self):
+        return len(self._rows)
+
+    def add(self, user_id: Optional[int], metrics: List) -> int:
+        """
+        Queue a batch of MetricCreate items; rejects the whole batch when full
+        """
+        if len(self._rows) + len(metrics) > self.max_rows:
+            self.rejected += len(metrics)
+            raise MetricsBufferFull()
+
+        now = datetime.utcnow()
+        self._rows.extend(
+            {"user_id": user_id, "type": m.type, "data": m.data, "created_at": now}
+            for m in metrics
+        )
+        if len(self._rows) >= self.flush_rows:
+            self._wakeup.set()
+        return len(metrics)
+
+    async def _insert(self, rows: list):
+        async with AsyncSessionLocal() as db:
+            for start in range(0, len(rows), self.flush_rows):
+                chunk = rows[start:start + self.flush_rows]
+                await db.execute(insert(Metric).values(chunk))
+                await apply_rollups(db, chunk)
+            await db.commit()
+
+    def _requeue(self, rows: list):
+        # Put the rows back if there is room, otherwise drop them
+        room = self.max_rows - len(self._rows)
+        self._rows[:0] = rows[:room]
+        self.dropped += max(len(rows) - room, 0)
+
+    async def flush(self) -> int:
+        """
+        Write buffered rows in one transaction. When that fails on the data
+        rather than the connection, the batch is bisected so only rows that
+        fail on their own are dropped and the rest still get written.
+        """
+        async with self._flush_lock:
+            rows, self._rows = self._rows, []
+            written = 0
+            pending = [rows] if rows else []
+            while pending:
+                batch = pending.pop()
+                try:
+                    await self._insert(batch)
+                except Exception as e:
+                    if is_transient_error(e):
+                        # Database unavailable: keep everything not yet written for the next flush
+                        self._requeue([row for part in [batch] + pending[::-1] for row in part])
+                        print(f"❌ Failed to flush metrics: {e}")
+                        break
+                    if len(batch) == 1:
+                        self.invalid += 1
+                        print(f"❌ Dropping metric that cannot be stored: {e}")
+                        continue
+                    mid = len(batch) // 2
+                    pending += [batch[mid:], batch[:mid]]
+                    continue
+                written += len(batch)
+
+            self.flushed += written
+            return written
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    def start(self):
+        if self._task is None:
+            self._stopping = False
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        # Let the flusher finish its current write rather than cancelling it
+        self._stopping = True
+        self._wakeup.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+        await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "buffered": len(self._rows),
+            "max_rows": self.max_rows,
+            "flushed": self.flushed,
+            "rejected": self.rejected,
+            "dropped": self.dropped,
+            "invalid": self.invalid,
+        }
+
+
+metrics_buffer = MetricsBuffer(
+    max_rows=METRICS_BUFFER_MAX_ROWS,
+    flush_rows=METRICS_FLUSH_ROWS,
+    flush_interval=METRICS_FLUSH_INTERVAL_SECONDS,
+)
+
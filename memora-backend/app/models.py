@@ -1,5 +1,5 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Float, ForeignKey, LargeBinary, Text, JSON
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, BigInteger, String, Date, DateTime, Boolean, Float, ForeignKey, LargeBinary, Text, JSON, Index, UniqueConstraint, text
+from sqlalchemy.orm import relationship, deferred
 from datetime import datetime
 from app.database import Base
 
@@ -11,36 +11,59 @@ class User(Base):
     password_hash = Column(String, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
     last_login = Column(DateTime, nullable=True)
-    
-    # Password reset fields
-    reset_token = Column(String, nullable=True)
-    reset_token_expires = Column(DateTime, nullable=True)
+    # Skip this user in the daily study digest
+    digest_opt_out = Column(Boolean, nullable=False, default=False, server_default="false")
     
     flashcard_sets = relationship("FlashcardSet", back_populates="owner")
 
 
+class PasswordResetToken(Base):
+    __tablename__ = "password_reset_tokens"
+    
+    # Only the SHA-256 of the emailed token is stored; the primary key makes lookups an index probe
+    token_hash = Column(String(64), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.user_id", ondelete="CASCADE"), nullable=False, index=True)
+    expires_at = Column(DateTime, nullable=False, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
 class FlashcardSet(Base):
     __tablename__ = "flashcard_sets"
     
     set_id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.user_id"))
+    user_id = Column(Integer, ForeignKey("users.user_id"), index=True)
     title = Column(String, nullable=False)
     description = Column(Text, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     owner = relationship("User", back_populates="flashcard_sets")
-    flashcards = relationship("Flashcard", back_populates="flashcard_set", cascade="all, delete-orphan")
+    # passive_deletes: the database cascades to cards (and their links) in one statement
+    flashcards = relationship("Flashcard", back_populates="flashcard_set", cascade="all, delete-orphan", passive_deletes=True)
+
+# Weighted full-text document for a card; GET /api/search must use this exact
+# expression for Postgres to match it to the GIN index below
+CARD_SEARCH_DOCUMENT = (
+    "setweight(to_tsvector('english', coalesce(front_text, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(back_text, '')), 'B') || "
+    "setweight(to_tsvector('english', coalesce(category, '')), 'C')"
+)
 
 class Flashcard(Base):
     __tablename__ = "flashcards"
+    __table_args__ = (
+        # Keyset pagination order for GET /api/sets/{set_id}/cards
+        Index("ix_flashcards_set_order_card", "set_id", text("coalesce(order_number, 0)"), "card_id"),
+        Index("ix_flashcards_search", text(f"({CARD_SEARCH_DOCUMENT})"), postgresql_using="gin"),
+    )
     
     card_id = Column(Integer, primary_key=True, index=True)
-    set_id = Column(Integer, ForeignKey("flashcard_sets.set_id"))
+    set_id = Column(Integer, ForeignKey("flashcard_sets.set_id", ondelete="CASCADE"))
     front_text = Column(Text, nullable=False)
     back_text = Column(Text, nullable=False)
-    front_image = Column(LargeBinary, nullable=True)
-    back_image = Column(LargeBinary, nullable=True)
+    # Deferred: only GET /api/cards/{card_id}/image/{side} loads the blobs
+    front_image = deferred(Column(LargeBinary, nullable=True))
+    back_image = deferred(Column(LargeBinary, nullable=True))
     category = Column(String, nullable=True)
     order_number = Column(Integer, nullable=True)
     position_x = Column(Float, nullable=True)
@@ -49,32 +72,149 @@ class Flashcard(Base):
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     flashcard_set = relationship("FlashcardSet", back_populates="flashcards")
-    links_from = relationship("FlashcardLink", foreign_keys="[FlashcardLink.from_card_id]", back_populates="from_card")
-    links_to = relationship("FlashcardLink", foreign_keys="[FlashcardLink.to_card_id]", back_populates="to_card")
+    links_from = relationship("FlashcardLink", foreign_keys="[FlashcardLink.from_card_id]", back_populates="from_card", cascade="all, delete-orphan", passive_deletes=True)
+    links_to = relationship("FlashcardLink", foreign_keys="[FlashcardLink.to_card_id]", back_populates="to_card", cascade="all, delete-orphan", passive_deletes=True)
+
+class ImportJob(Base):
+    __tablename__ = "import_jobs"
+    
+    # Progress of POST /api/sets/import, keyed by a client-chosen id so it can be polled mid-upload
+    user_id = Column(Integer, ForeignKey("users.user_id", ondelete="CASCADE"), primary_key=True)
+    import_id = Column(String(64), primary_key=True)
+    set_id = Column(Integer, ForeignKey("flashcard_sets.set_id", ondelete="SET NULL"), nullable=True)
+    format = Column(String, nullable=False)
+    status = Column(String, nullable=False, default="running")  # 'running', 'completed', 'failed'
+    rows_imported = Column(Integer, nullable=False, default=0)
+    rows_skipped = Column(Integer, nullable=False, default=0)
+    bytes_read = Column(BigInteger, nullable=False, default=0)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow)
 
 class FlashcardLink(Base):
     __tablename__ = "flashcard_links"
+    __table_args__ = (
+        # One link per ordered pair; its index also serves from_card_id lookups
+        UniqueConstraint("from_card_id", "to_card_id", name="uq_flashcard_links_from_to"),
+    )
     
     link_id = Column(Integer, primary_key=True, index=True)
-    from_card_id = Column(Integer, ForeignKey("flashcards.card_id"))
-    to_card_id = Column(Integer, ForeignKey("flashcards.card_id"))
+    from_card_id = Column(Integer, ForeignKey("flashcards.card_id", ondelete="CASCADE"), nullable=False)
+    to_card_id = Column(Integer, ForeignKey("flashcards.card_id", ondelete="CASCADE"), nullable=False, index=True)
     link_type = Column(String, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     
     from_card = relationship("Flashcard", foreign_keys=[from_card_id], back_populates="links_from")
     to_card = relationship("Flashcard", foreign_keys=[to_card_id], back_populates="links_to")
 
+class ReviewState(Base):
+    __tablename__ = "review_states"
+    __table_args__ = (
+        # GET /api/study/next walks a user's cards in due order
+        Index("ix_review_states_user_due", "user_id", "due_at"),
+    )
+    
+    # Spaced-repetition (SM-2) state per user per card
+    user_id = Column(Integer, ForeignKey("users.user_id", ondelete="CASCADE"), primary_key=True)
+    card_id = Column(Integer, ForeignKey("flashcards.card_id", ondelete="CASCADE"), primary_key=True, index=True)
+    due_at = Column(DateTime, nullable=False)
+    interval_days = Column(Float, nullable=False, default=0)
+    ease = Column(Float, nullable=False, default=2.5)
+    repetitions = Column(Integer, nullable=False, default=0)
+    lapses = Column(Integer, nullable=False, default=0)
+    last_grade = Column(Integer, nullable=True)
+    last_reviewed_at = Column(DateTime, nullable=True)
+
+class ReviewEvent(Base):
+    __tablename__ = "review_events"
+    
+    # Client-supplied event ids make POST /api/study/sync idempotent
+    user_id = Column(Integer, ForeignKey("users.user_id", ondelete="CASCADE"), primary_key=True)
+    event_id = Column(String(64), primary_key=True)
+    card_id = Column(Integer, ForeignKey("flashcards.card_id", ondelete="CASCADE"), nullable=False)
+    grade = Column(Integer, nullable=False)
+    reviewed_at = Column(DateTime, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
 class Metric(Base):
     __tablename__ = "metrics"
+    __table_args__ = (
+        # Every time-window query filters on type (or user) plus created_at
+        Index("ix_metrics_type_created_at", "type", "created_at"),
+        Index("ix_metrics_user_id_created_at", "user_id", "created_at"),
+        # Daily range partitions, managed by app.partitions
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
     
-    metric_id = Column(Integer, primary_key=True, index=True)
+    # Partition key has to be part of the primary key
+    metric_id = Column(Integer, primary_key=True, autoincrement=True, index=True)
     user_id = Column(Integer, ForeignKey("users.user_id"), nullable=True)  # Optional: track per-user metrics
-    type = Column(String, index=True, nullable=False)  # 'page_load', 'error', 'latency', etc.
+    type = Column(String, nullable=False)  # 'page_load', 'error', 'latency', etc.
     data = Column(JSON, nullable=False)  # Store all metric data as JSON
-    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    created_at = Column(DateTime, primary_key=True, default=datetime.utcnow, index=True)
     
     # Optional relationship to user
     user = relationship("User")
     
     def __repr__(self):
-        return f"<Metric(metric_id={self.metric_id}, type={self.type}, created_at={self.created_at})>"
\ No newline at end of file
+        return f"<Metric(metric_id={self.metric_id}, type={self.type}, created_at={self.created_at})>"
+
+
+class MetricRollup(Base):
+    __tablename__ = "metric_rollups"
+    
+    # Pre-aggregated metric buckets ('minute' or 'hour') read by the dashboard
+    granularity = Column(String, primary_key=True)
+    type = Column(String, primary_key=True)
+    bucket_start = Column(DateTime, primary_key=True)
+    action = Column(String, primary_key=True, default="")
+    count = Column(BigInteger, nullable=False, default=0)
+    sum = Column(Float, nullable=False, default=0)
+    min = Column(Float, nullable=True)
+    max = Column(Float, nullable=True)
+    sketch = Column(LargeBinary, nullable=True)  # Serialized DDSketch for percentiles
+
+
+class ActiveUserDay(Base):
+    __tablename__ = "metric_active_users"
+    __table_args__ = (
+        # Last-active lookups by user range (app.digest)
+        Index("ix_metric_active_users_user_day", "user_id", "day"),
+    )
+    
+    # One row per user per day with 'user_activity', for distinct-user counts
+    day = Column(Date, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.user_id", ondelete="CASCADE"), primary_key=True)
+
+
+class EmailOutbox(Base):
+    __tablename__ = "email_outbox"
+    __table_args__ = (
+        # The sender's claim query: due, still-pending messages in order
+        Index(
+            "ix_email_outbox_pending_next_attempt",
+            "next_attempt_at",
+            postgresql_where=text("status = 'pending'")
+        ),
+    )
+    
+    # Written in the caller's transaction, delivered by app.email_outbox
+    email_id = Column(BigInteger, primary_key=True, autoincrement=True)
+    to_email = Column(String, nullable=False)
+    subject = Column(String, nullable=False)
+    html_body = Column(Text, nullable=False)
+    text_body = Column(Text, nullable=True)
+    status = Column(String, nullable=False, default="pending")  # 'pending', 'sent', 'failed'
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    sent_at = Column(DateTime, nullable=True)
+
+
+class DigestDelivery(Base):
+    __tablename__ = "email_digests"
+    
+    # One row per user per digest day; claimed before enqueueing so reruns never double-send
+    day = Column(Date, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.user_id", ondelete="CASCADE"), primary_key=True)
@@ -0,0 +1,24 @@
+import base64
+from typing import Optional, Tuple
+from fastapi import HTTPException
+
+
+def encode_cursor(*keys) -> str:
+    """
+    Opaque keyset cursor from the sort key of the last row on a page
+    """
+    raw = ",".join(str(k) for k in keys)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str], size: int = 2) -> Optional[Tuple[int, ...]]:
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        keys = tuple(int(k) for k in base64.urlsafe_b64decode(padded).decode().split(","))
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if len(keys) != size:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return keys
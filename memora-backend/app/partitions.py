@@ -0,0 +1,120 @@
+import os
+from datetime import date, datetime, timedelta
+from typing import List
+from dotenv import load_dotenv
+from sqlalchemy import text, delete
+from sqlalchemy.engine import Connection, Engine
+
+from app.models import MetricRollup, ActiveUserDay
+
+load_dotenv()
+
+# Daily partitions are created this many days ahead of today
+METRICS_PARTITIONS_AHEAD_DAYS = int(os.getenv("METRICS_PARTITIONS_AHEAD_DAYS", 7))
+# Whole partitions older than this are dropped; 0 keeps everything
+METRICS_RETENTION_DAYS = int(os.getenv("METRICS_RETENTION_DAYS", 90))
+# Minute rollups only back windows of up to a day
+MINUTE_ROLLUP_RETENTION_DAYS = int(os.getenv("MINUTE_ROLLUP_RETENTION_DAYS", 2))
+PARTITION_MAINTENANCE_INTERVAL_SECONDS = float(
+    os.getenv("PARTITION_MAINTENANCE_INTERVAL_SECONDS", 3600)
+)
+
+PARENT_TABLE = "metrics"
+PARTITION_PREFIX = "metrics_p"
+
+# Serializes partition DDL across workers
+ADVISORY_LOCK_ID = 7231001
+
+
+def partition_name(day: date) -> str:
+    return f"{PARTITION_PREFIX}{day:%Y%m%d}"
+
+
+# The catalog lookups resolve PARENT_TABLE through search_path via regclass,
+# like the DDL below does, so same-named tables in other schemas don't match
+def is_partitioned(conn: Connection) -> bool:
+    return conn.execute(text(
+        "SELECT 1 FROM pg_partitioned_table pt "
+        "WHERE pt.partrelid = CAST(:table AS regclass)"
+    ), {"table": PARENT_TABLE}).first() is not None
+
+
+def list_partitions(conn: Connection) -> List[date]:
+    rows = conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = CAST(:table AS regclass)"
+    ), {"table": PARENT_TABLE}).scalars().all()
+
+    days = []
+    for name in rows:
+        try:
+            days.append(datetime.strptime(name[len(PARTITION_PREFIX):], "%Y%m%d").date())
+        except ValueError:
+            continue  # not one of ours
+    return sorted(days)
+
+
+def create_partitions(conn: Connection, start: date, end: date) -> int:
+    """
+    Create daily partitions covering [start, end]
+    """
+    created = 0
+    existing = set(list_partitions(conn))
+    day = start
+    while day <= end:
+        if day not in existing:
+            conn.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {partition_name(day)} "
+                f"PARTITION OF {PARENT_TABLE} "
+                f"FOR VALUES FROM ('{day.isoformat()}') TO ('{(day + timedelta(days=1)).isoformat()}')"
+            ))
+            created += 1
+        day += timedelta(days=1)
+    return created
+
+
+def drop_expired_partitions(conn: Connection, retention_days: int) -> int:
+    """
+    Drop partitions whose whole day falls outside the retention window
+    """
+    if retention_days <= 0:
+        return 0
+
+    cutoff = datetime.utcnow().date() - timedelta(days=retention_days)
+    dropped = 0
+    for day in list_partitions(conn):
+        if day + timedelta(days=1) <= cutoff:
+            conn.execute(text(f"DROP TABLE IF EXISTS {partition_name(day)}"))
+            dropped += 1
+    return dropped
+
+
+def maintain_partitions(engine: Engine) -> dict:
+    """
+    Create upcoming partitions, drop expired ones, and prune old minute rollups
+    """
+    with engine.begin() as conn:
+        conn.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": ADVISORY_LOCK_ID})
+
+        created = dropped = 0
+        if is_partitioned(conn):
+            today = datetime.utcnow().date()
+            created = create_partitions(conn, today, today + timedelta(days=METRICS_PARTITIONS_AHEAD_DAYS))
+            dropped = drop_expired_partitions(conn, METRICS_RETENTION_DAYS)
+        else:
+            print(f"⚠️ {PARENT_TABLE} is not partitioned; see migrations/002_partition_metrics.sql")
+
+        # Rollup tables are small, so a plain DELETE is fine here
+        minute_cutoff = datetime.utcnow() - timedelta(days=MINUTE_ROLLUP_RETENTION_DAYS)
+        conn.execute(delete(MetricRollup).where(
+            MetricRollup.granularity == "minute",
+            MetricRollup.bucket_start < minute_cutoff
+        ))
+        if METRICS_RETENTION_DAYS > 0:
+            cutoff = datetime.utcnow() - timedelta(days=METRICS_RETENTION_DAYS)
+            conn.execute(delete(MetricRollup).where(MetricRollup.bucket_start < cutoff))
+            conn.execute(delete(ActiveUserDay).where(ActiveUserDay.day < cutoff.date()))
+
+    return {"created": created, "dropped": dropped}
+
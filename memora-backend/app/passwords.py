@@ -0,0 +1,133 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional, Tuple
+from dotenv import load_dotenv
+from fastapi import HTTPException
+from passlib.context import CryptContext
+
+# Imported by the pool's worker processes too, so keep this module free of app / database imports
+
+load_dotenv()
+
+# Changing the cost rehashes each user's password on their next login
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+PASSWORD_POOL_WORKERS = int(os.getenv("PASSWORD_POOL_WORKERS", min(2, os.cpu_count() or 1)))
+# Hash / verify jobs allowed to wait for a worker before requests get a 503
+PASSWORD_POOL_QUEUE = int(os.getenv("PASSWORD_POOL_QUEUE", 32))
+PASSWORD_POOL_RETRY_AFTER_SECONDS = 1
+
+# min_rounds == max_rounds: any hash with a different cost needs an update
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
+
+
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def _verify_and_update(password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+    return pwd_context.verify_and_update(password, hashed)
+
+
+def busy_error() -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail="Authentication is busy, please retry",
+        headers={"Retry-After": str(PASSWORD_POOL_RETRY_AFTER_SECONDS)},
+    )
+
+
+class PasswordPool:
+    """
+    Runs bcrypt on a small process pool so it neither blocks the event loop
+    nor ties up the request threadpool; rejects work beyond a fixed backlog
+    """
+
+    def __init__(self, workers: int, queue_limit: int):
+        self.workers = workers
+        self.max_in_flight = workers + queue_limit
+        self.in_flight = 0
+        self.rejected = 0
+        self.completed = 0
+        self.restarts = 0
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn: forking a process that already runs threads is unsafe
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    def _discard_executor(self, executor: ProcessPoolExecutor):
+        """
+        Drop a broken pool (e.g. a worker was OOM-killed) so the next call
+        starts a fresh one
+        """
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+                self.restarts += 1
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    async def run(self, fn, *args):
+        with self._lock:
+            if self.in_flight >= self.max_in_flight:
+                self.rejected += 1
+                raise busy_error()
+            self.in_flight += 1
+            executor = self._get_executor()
+        try:
+            return await asyncio.wrap_future(executor.submit(fn, *args))
+        except BrokenProcessPool:
+            self._discard_executor(executor)
+            print("⚠️ Password worker pool broke, restarting it")
+            raise busy_error()
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+                self.completed += 1
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "max_in_flight": self.max_in_flight,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "restarts": self.restarts,
+            "bcrypt_rounds": BCRYPT_ROUNDS,
+        }
+
+
+password_pool = PasswordPool(PASSWORD_POOL_WORKERS, PASSWORD_POOL_QUEUE)
+
+
+async def hash_password(password: str) -> str:
+    return await password_pool.run(_hash, password)
+
+
+async def check_password(password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+    """
+    Returns (valid, new_hash); new_hash is set when the stored hash should
+    be replaced because BCRYPT_ROUNDS changed
+    """
+    return await password_pool.run(_verify_and_update, password, hashed)
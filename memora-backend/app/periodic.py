@@ -0,0 +1,20 @@
+import asyncio
+from typing import Callable, Union
+
+
+async def run_periodic(name: str, interval: Union[float, Callable[[], float]], fn: Callable):
+    """
+    Background loop for the app lifespan: sleep `interval` seconds (or
+    interval() when it's a callable), then run fn. Blocking functions run
+    in a thread, coroutine functions on the event loop; a failed run is
+    logged and the loop carries on.
+    """
+    while True:
+        await asyncio.sleep(interval() if callable(interval) else interval)
+        try:
+            if asyncio.iscoroutinefunction(fn):
+                await fn()
+            else:
+                await asyncio.to_thread(fn)
+        except Exception as e:
+            print(f"❌ {name} failed: {e}")
@@ -0,0 +1,36 @@
+import hashlib
+import os
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+from sqlalchemy import delete
+from sqlalchemy.engine import Engine
+
+from app.models import PasswordResetToken
+
+load_dotenv()
+
+RESET_TOKEN_TTL = timedelta(hours=1)
+RESET_TOKEN_SWEEP_INTERVAL_SECONDS = float(os.getenv("RESET_TOKEN_SWEEP_INTERVAL_SECONDS", 3600))
+
+
+def hash_reset_token(token: str) -> str:
+    """
+    Tokens are 256 random bits, so a single fast hash is enough; no salt or bcrypt needed
+    """
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+def new_reset_token_row(user_id: int, token: str) -> PasswordResetToken:
+    return PasswordResetToken(
+        token_hash=hash_reset_token(token),
+        user_id=user_id,
+        expires_at=datetime.utcnow() + RESET_TOKEN_TTL
+    )
+
+
+def sweep_expired_reset_tokens(engine: Engine) -> int:
+    with engine.begin() as conn:
+        result = conn.execute(delete(PasswordResetToken).where(
+            PasswordResetToken.expires_at < datetime.utcnow()
+        ))
+    return result.rowcount
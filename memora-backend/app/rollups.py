@@ -0,0 +1,240 @@
+import math
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import select, update, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import Metric, MetricRollup, ActiveUserDay
+from app.sketch import DDSketch
+
+# Bucket widths kept for every metric type
+GRANULARITIES = ("minute", "hour")
+
+# JSON field aggregated into sum/min/max for each metric type
+VALUE_FIELDS = {
+    "page_load": "duration",
+    "latency": "duration",
+    "satisfaction": "rating",
+    "db_pool": "in_use",
+}
+
+MAX_ACTION_LENGTH = 100
+
+
+def truncate(ts: datetime, granularity: str) -> datetime:
+    if granularity == "minute":
+        return ts.replace(second=0, microsecond=0)
+    return ts.replace(minute=0, second=0, microsecond=0)
+
+
+def metric_value(metric_type: str, data: dict) -> Optional[float]:
+    field = VALUE_FIELDS.get(metric_type)
+    if field is None or not isinstance(data, dict):
+        return None
+    try:
+        value = float(data.get(field, 0))
+    except (TypeError, ValueError, OverflowError):
+        return None
+    # "nan" / "1e999" parse as floats but can't be summed or sketched
+    return value if math.isfinite(value) else None
+
+
+def metric_action(data: dict) -> str:
+    action = data.get("action") if isinstance(data, dict) else None
+    if not isinstance(action, str):
+        return ""
+    return action[:MAX_ACTION_LENGTH]
+
+
+def aggregate_rows(rows: List[dict]) -> Dict[Tuple, list]:
+    """
+    Fold raw metric rows into
+    {(granularity, type, bucket, action): [count, sum, min, max, sketch]}
+    """
+    buckets = {}
+    for row in rows:
+        value = metric_value(row["type"], row["data"])
+        action = metric_action(row["data"])
+        for granularity in GRANULARITIES:
+            key = (granularity, row["type"], truncate(row["created_at"], granularity), action)
+            acc = buckets.get(key)
+            if acc is None:
+                acc = buckets[key] = [0, 0.0, None, None, None]
+            acc[0] += 1
+            if value is not None:
+                acc[1] += value
+                acc[2] = value if acc[2] is None else min(acc[2], value)
+                acc[3] = value if acc[3] is None else max(acc[3], value)
+                if acc[4] is None:
+                    acc[4] = DDSketch()
+                acc[4].add(value)
+    return buckets
+
+
+async def apply_rollups(db: AsyncSession, rows: List[dict]):
+    """
+    Merge a batch of raw metric rows into the rollup tables; runs in the
+    caller's transaction so rollups commit together with the raw rows
+    """
+    buckets = aggregate_rows(rows)
+    if buckets:
+        # Sorted so concurrent writers lock buckets in the same order
+        values = [
+            {
+                "granularity": granularity, "type": metric_type,
+                "bucket_start": bucket_start, "action": action,
+                "count": acc[0], "sum": acc[1], "min": acc[2], "max": acc[3],
+            }
+            for (granularity, metric_type, bucket_start, action), acc in sorted(buckets.items())
+        ]
+        stmt = pg_insert(MetricRollup).values(values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["granularity", "type", "bucket_start", "action"],
+            set_={
+                "count": MetricRollup.count + stmt.excluded.count,
+                "sum": MetricRollup.sum + stmt.excluded.sum,
+                "min": func.least(MetricRollup.min, stmt.excluded.min),
+                "max": func.greatest(MetricRollup.max, stmt.excluded.max),
+            },
+        ).returning(
+            MetricRollup.granularity, MetricRollup.type, MetricRollup.bucket_start,
+            MetricRollup.action, MetricRollup.sketch,
+        )
+        # The sketch column is left out of the upsert, so RETURNING hands back
+        # the stored sketch (NULL for new buckets) with the row already locked
+        result = await db.execute(stmt)
+
+        sketch_updates = []
+        for granularity, metric_type, bucket_start, action, stored in result.all():
+            sketch = buckets[(granularity, metric_type, bucket_start, action)][4]
+            if sketch is None:
+                continue
+            if stored is not None:
+                sketch = DDSketch.from_bytes(stored).merge(sketch)
+            sketch_updates.append({
+                "granularity": granularity, "type": metric_type,
+                "bucket_start": bucket_start, "action": action,
+                "sketch": sketch.to_bytes(),
+            })
+        if sketch_updates:
+            await db.execute(update(MetricRollup), sketch_updates)
+
+    active = sorted({
+        (row["created_at"].date(), row["user_id"])
+        for row in rows
+        if row["type"] == "user_activity" and row.get("user_id") is not None
+    })
+    if active:
+        stmt = pg_insert(ActiveUserDay).values(
+            [{"day": day, "user_id": user_id} for day, user_id in active]
+        ).on_conflict_do_nothing()
+        await db.execute(stmt)
+
+
+async def rollup_totals(
+    db: AsyncSession,
+    metric_types: List[str],
+    since: datetime,
+) -> Dict[str, Tuple[int, float]]:
+    """
+    Sum rollup buckets newer than `since` into {action: (count, sum)}
+    """
+    # Minute buckets for windows up to a day, hour buckets beyond that
+    granularity = "minute" if datetime.utcnow() - since <= timedelta(days=1) else "hour"
+
+    result = await db.execute(
+        select(MetricRollup.action, func.sum(MetricRollup.count), func.sum(MetricRollup.sum))
+        .where(
+            MetricRollup.granularity == granularity,
+            MetricRollup.type.in_(metric_types),
+            MetricRollup.bucket_start >= truncate(since, granularity),
+        )
+        .group_by(MetricRollup.action)
+    )
+    return {
+        action: (int(count or 0), float(total or 0))
+        for action, count, total in result.all()
+    }
+
+
+async def rollup_sketches(
+    db: AsyncSession,
+    metric_types: List[str],
+    since: datetime,
+) -> Dict[str, DDSketch]:
+    """
+    Merge the sketches of every bucket newer than `since` into one per action
+    """
+    granularity = "minute" if datetime.utcnow() - since <= timedelta(days=1) else "hour"
+
+    result = await db.execute(
+        select(MetricRollup.action, MetricRollup.sketch).where(
+            MetricRollup.granularity == granularity,
+            MetricRollup.type.in_(metric_types),
+            MetricRollup.bucket_start >= truncate(since, granularity),
+            MetricRollup.sketch.isnot(None),
+        )
+    )
+    sketches = {}
+    for action, stored in result.all():
+        sketch = DDSketch.from_bytes(stored)
+        if action in sketches:
+            sketches[action].merge(sketch)
+        else:
+            sketches[action] = sketch
+    return sketches
+
+
+def combine_totals(totals: Dict[str, Tuple[int, float]]) -> Tuple[int, float]:
+    return (
+        sum(count for count, _ in totals.values()),
+        sum(total for _, total in totals.values()),
+    )
+
+
+async def count_active_users(db: AsyncSession, since: datetime) -> int:
+    result = await db.execute(
+        select(func.count(func.distinct(ActiveUserDay.user_id))).where(
+            ActiveUserDay.day >= since.date()
+        )
+    )
+    return result.scalar() or 0
+
+
+async def backfill_rollups(db: AsyncSession, since: datetime, chunk_size: int = 5000) -> int:
+    """
+    Rebuild rollups from raw metrics created after `since`; the target
+    buckets should be empty (or truncated) beforehand to avoid double counting
+    """
+    processed = 0
+    last_id = 0
+    while True:
+        result = await db.execute(
+            select(Metric.metric_id, Metric.user_id, Metric.type, Metric.data, Metric.created_at)
+            .where(Metric.created_at >= since, Metric.metric_id > last_id)
+            .order_by(Metric.metric_id)
+            .limit(chunk_size)
+        )
+        rows = [dict(r._mapping) for r in result.all()]
+        if not rows:
+            break
+        await apply_rollups(db, rows)
+        await db.commit()
+        processed += len(rows)
+        last_id = rows[-1]["metric_id"]
+    return processed
+
+
+if __name__ == "__main__":
+    # python -m app.rollups [days]  -- rebuild rollups from recent raw metrics
+    import asyncio
+    import sys
+    from app.database import AsyncSessionLocal
+
+    async def main(days: int):
+        async with AsyncSessionLocal() as db:
+            processed = await backfill_rollups(db, datetime.utcnow() - timedelta(days=days))
+        print(f"✅ Rolled up {processed} metrics")
+
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 30))
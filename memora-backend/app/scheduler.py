@@ -0,0 +1,67 @@
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+# SM-2 constants
+DEFAULT_EASE = 2.5
+MIN_EASE = 1.3
+PASSING_GRADE = 3  # grades run 0 (blackout) to 5 (perfect recall)
+
+
+@dataclass
+class Schedule:
+    due_at: datetime
+    interval_days: float
+    ease: float
+    repetitions: int
+    lapses: int
+
+
+def next_schedule(
+    grade: int,
+    reviewed_at: datetime,
+    interval_days: float = 0,
+    ease: float = DEFAULT_EASE,
+    repetitions: int = 0,
+    lapses: int = 0,
+) -> Schedule:
+    """
+    Apply one SM-2 review to a card's state and return the new schedule
+    """
+    if grade >= PASSING_GRADE:
+        if repetitions == 0:
+            interval_days = 1
+        elif repetitions == 1:
+            interval_days = 6
+        else:
+            interval_days = round(interval_days * ease, 2)
+        repetitions += 1
+    else:
+        # Lapse: start the card over tomorrow
+        repetitions = 0
+        interval_days = 1
+        lapses += 1
+
+    ease = max(MIN_EASE, ease + 0.1 - (5 - grade) * (0.08 + (5 - grade) * 0.02))
+
+    return Schedule(
+        due_at=reviewed_at + timedelta(days=interval_days),
+        interval_days=interval_days,
+        ease=round(ease, 4),
+        repetitions=repetitions,
+        lapses=lapses,
+    )
+
+
+def schedule_from_state(state, grade: int, reviewed_at: datetime) -> Schedule:
+    """
+    next_schedule for an existing ReviewState row, or a new card when state is None
+    """
+    if state is None:
+        return next_schedule(grade, reviewed_at)
+    return next_schedule(
+        grade, reviewed_at,
+        interval_days=state.interval_days,
+        ease=state.ease,
+        repetitions=state.repetitions,
+        lapses=state.lapses,
+    )
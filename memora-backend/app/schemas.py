@@ -1,4 +1,4 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
 from typing import Optional, List, Dict, Any
 from datetime import datetime
 
@@ -55,6 +55,12 @@ class FlashcardUpdate(BaseModel):
     position_x: Optional[float] = None
     position_y: Optional[float] = None
 
+class FlashcardBulkUpdate(FlashcardUpdate):
+    card_id: int
+
+class FlashcardBulkDelete(BaseModel):
+    card_ids: List[int]
+
 class FlashcardResponse(BaseModel):
     card_id: int
     front_text: str
@@ -69,6 +75,109 @@ class FlashcardResponse(BaseModel):
         from_attributes = True
 
 
+# Deck import schemas
+class ImportRowError(BaseModel):
+    line: int
+    error: str
+
+class ImportResult(BaseModel):
+    import_id: str
+    set_id: int
+    imported: int
+    skipped: int
+    errors: List[ImportRowError]  # first few skipped rows only
+
+class ImportJobResponse(BaseModel):
+    import_id: str
+    set_id: Optional[int]
+    format: str
+    status: str
+    rows_imported: int
+    rows_skipped: int
+    bytes_read: int
+    error: Optional[str]
+    created_at: datetime
+    updated_at: datetime
+    
+    class Config:
+        from_attributes = True
+
+# Whiteboard graph schemas (parallel arrays: index i of each list is one card / link)
+class GraphCards(BaseModel):
+    card_id: List[int]
+    order_number: List[Optional[int]]
+    position_x: List[Optional[float]]
+    position_y: List[Optional[float]]
+
+class GraphLinks(BaseModel):
+    link_id: List[int]
+    from_card_id: List[int]
+    to_card_id: List[int]
+    link_type: List[Optional[str]]
+
+class SetGraphResponse(BaseModel):
+    set_id: int
+    cards: GraphCards
+    links: GraphLinks
+
+# Search schemas
+class SearchResult(BaseModel):
+    card_id: int
+    set_id: int
+    set_title: str
+    front_text: str
+    back_text: str
+    category: Optional[str]
+    rank: float
+    front_snippet: str  # HTML-escaped card text, matches wrapped in <mark>...</mark>
+    back_snippet: str
+
+class SearchResponse(BaseModel):
+    query: str
+    results: List[SearchResult]
+    limit: int
+    offset: int
+    has_more: bool
+
+# Spaced-repetition schemas
+class ReviewCreate(BaseModel):
+    card_id: int
+    grade: int = Field(ge=0, le=5)  # SM-2 grade: 0 = blackout, 5 = perfect recall
+    reviewed_at: Optional[datetime] = None
+
+class ReviewStateResponse(BaseModel):
+    card_id: int
+    due_at: datetime
+    interval_days: float
+    ease: float
+    repetitions: int
+    lapses: int
+    last_reviewed_at: Optional[datetime]
+    
+    class Config:
+        from_attributes = True
+
+class StudyCard(FlashcardResponse):
+    set_id: int
+    due_at: Optional[datetime]  # None for cards never reviewed
+
+class ReviewEventCreate(BaseModel):
+    event_id: str = Field(min_length=1, max_length=64)
+    card_id: int
+    grade: int = Field(ge=0, le=5)
+    reviewed_at: datetime
+
+class StudySyncRequest(BaseModel):
+    events: List[ReviewEventCreate]
+    limit: int = Field(20, ge=0, le=200)  # how many due cards to send back
+    set_id: Optional[int] = None
+
+class StudySyncResponse(BaseModel):
+    applied: int
+    duplicate_event_ids: List[str]
+    rejected_event_ids: List[str]
+    due_cards: List[StudyCard]
+
 # Metrics schemas
 class MetricCreate(BaseModel):
     type: str
@@ -89,6 +198,7 @@ class MetricsDashboard(BaseModel):
     weeklyActiveUsers: int
     avgSatisfaction: float
     avgLatency: Dict[str, float]
+    latencyPercentiles: Dict[str, Dict[str, float]] = {}
     period: Dict[str, str]
 
 class UptimeStatus(BaseModel):
@@ -0,0 +1,80 @@
+import html
+from typing import Optional
+from sqlalchemy import select, func, literal_column
+from sqlalchemy.orm import Session
+
+from app.models import Flashcard, FlashcardSet, CARD_SEARCH_DOCUMENT
+
+# Full-text search across a user's cards; the document expression and its
+# GIN index live in app.models
+SEARCH_PAGE_MAX = 100
+SEARCH_OFFSET_MAX = 1000
+SEARCH_CONFIG = literal_column("'english'::regconfig")
+# ts_headline returns raw card text, so it marks matches with control characters;
+# highlight_snippet escapes the text and only then turns them into <mark> tags
+SNIPPET_START = "\x02"
+SNIPPET_STOP = "\x03"
+SEARCH_HEADLINE_OPTIONS = f"StartSel={SNIPPET_START}, StopSel={SNIPPET_STOP}, MaxWords=30, MinWords=10, MaxFragments=2"
+
+
+def highlight_snippet(snippet: str) -> str:
+    return html.escape(snippet).replace(SNIPPET_START, "<mark>").replace(SNIPPET_STOP, "</mark>")
+
+
+def headline(column, tsquery):
+    # Markers already in the card text would otherwise become <mark> tags
+    text = func.translate(column, SNIPPET_START + SNIPPET_STOP, "")
+    return func.ts_headline(SEARCH_CONFIG, text, tsquery, SEARCH_HEADLINE_OPTIONS)
+
+
+def card_search_query(user_id: int, q: str, set_id: Optional[int], limit: int, offset: int):
+    """
+    One page of ranked matches (limit + 1 rows, to detect more) with snippets
+    """
+    document = literal_column(CARD_SEARCH_DOCUMENT)
+    tsquery = func.websearch_to_tsquery(SEARCH_CONFIG, q)
+
+    # Rank and page through matches using the GIN index first...
+    matches = select(
+        Flashcard.card_id,
+        FlashcardSet.title.label("set_title"),
+        func.ts_rank_cd(document, tsquery).label("rank")
+    ).join(
+        FlashcardSet, FlashcardSet.set_id == Flashcard.set_id
+    ).where(
+        FlashcardSet.user_id == user_id,
+        document.op("@@")(tsquery)
+    )
+    if set_id is not None:
+        matches = matches.where(Flashcard.set_id == set_id)
+    matches = matches.order_by(
+        literal_column("rank").desc(), Flashcard.card_id
+    ).limit(limit + 1).offset(offset).subquery()
+
+    # ...then build the (expensive) highlighted snippets for that page only
+    return select(
+        Flashcard.card_id, Flashcard.set_id, matches.c.set_title,
+        Flashcard.front_text, Flashcard.back_text, Flashcard.category, matches.c.rank,
+        headline(Flashcard.front_text, tsquery).label("front_snippet"),
+        headline(Flashcard.back_text, tsquery).label("back_snippet")
+    ).join(
+        matches, matches.c.card_id == Flashcard.card_id
+    ).order_by(matches.c.rank.desc(), Flashcard.card_id)
+
+
+def search_user_cards(db: Session, user_id: int, q: str, set_id: Optional[int], limit: int, offset: int) -> dict:
+    rows = db.execute(card_search_query(user_id, q, set_id, limit, offset)).all()
+    return {
+        "query": q,
+        "results": [
+            {
+                **row._mapping,
+                "front_snippet": highlight_snippet(row.front_snippet),
+                "back_snippet": highlight_snippet(row.back_snippet),
+            }
+            for row in rows[:limit]
+        ],
+        "limit": limit,
+        "offset": offset,
+        "has_more": len(rows) > limit
+    }
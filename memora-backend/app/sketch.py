@@ -0,0 +1,157 @@
+import math
+import struct
+from typing import Dict, Iterable, Optional
+
+# Quantile estimates are within 1% of the true value
+RELATIVE_ACCURACY = 0.01
+MAX_BINS = 2048
+
+# Values below this are counted in the zero bin
+MIN_INDEXABLE_VALUE = 1e-9
+
+FORMAT_VERSION = 1
+
+
+def _write_varint(out: bytearray, n: int):
+    while True:
+        byte = n & 0x7F
+        n >>= 7
+        if n:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return
+
+
+def _read_varint(buf: bytes, pos: int):
+    result = 0
+    shift = 0
+    while True:
+        byte = buf[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+
+
+def _zigzag(n: int) -> int:
+    return (n << 1) ^ (n >> 63)
+
+
+def _unzigzag(n: int) -> int:
+    return (n >> 1) ^ -(n & 1)
+
+
+class DDSketch:
+    """
+    Mergeable quantile sketch with relative-error guarantees (DDSketch).
+    Values fall into logarithmic bins, so two sketches merge by adding bin
+    counts and the size depends on the value range, not the number of values.
+    """
+
+    def __init__(self, relative_accuracy: float = RELATIVE_ACCURACY):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.bins: Dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+
+    def add(self, value: float, weight: int = 1):
+        # NaN / inf have no bin and would poison min/max; they are not counted
+        if not math.isfinite(value):
+            return
+        if value < MIN_INDEXABLE_VALUE:
+            self.zero_count += weight
+        else:
+            index = math.ceil(math.log(value) / self._log_gamma)
+            self.bins[index] = self.bins.get(index, 0) + weight
+            if len(self.bins) > MAX_BINS:
+                self._collapse()
+        self.count += weight
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def update(self, values: Iterable[float]):
+        for value in values:
+            self.add(value)
+
+    def merge(self, other: "DDSketch"):
+        if other.gamma != self.gamma:
+            raise ValueError("Cannot merge sketches with different accuracy")
+        for index, count in other.bins.items():
+            self.bins[index] = self.bins.get(index, 0) + count
+        if len(self.bins) > MAX_BINS:
+            self._collapse()
+        self.zero_count += other.zero_count
+        self.count += other.count
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+        return self
+
+    def _collapse(self):
+        # Fold the lowest bins together; only the low tail loses accuracy
+        indexes = sorted(self.bins)
+        excess = indexes[:len(indexes) - MAX_BINS + 1]
+        target = indexes[len(excess)]
+        self.bins[target] += sum(self.bins.pop(i) for i in excess)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if self.count == 0 or not 0 <= q <= 1:
+            return None
+
+        rank = q * (self.count - 1)
+        if rank < self.zero_count:
+            return 0.0
+
+        seen = self.zero_count
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if seen > rank:
+                value = 2 * self.gamma ** index / (self.gamma + 1)
+                return max(self.min, min(self.max, value))
+        return self.max
+
+    def to_bytes(self) -> bytes:
+        """
+        Compact encoding: header, then delta-encoded bin indexes as varints
+        """
+        out = bytearray(struct.pack(
+            "<Bddd", FORMAT_VERSION, self.relative_accuracy,
+            self.min if self.min is not None else math.nan,
+            self.max if self.max is not None else math.nan,
+        ))
+        _write_varint(out, self.zero_count)
+        _write_varint(out, len(self.bins))
+        previous = 0
+        for index in sorted(self.bins):
+            _write_varint(out, _zigzag(index - previous))
+            _write_varint(out, self.bins[index])
+            previous = index
+        return bytes(out)
+
+    @classmethod
+    def from_bytes(cls, buf: bytes) -> "DDSketch":
+        version, accuracy, min_value, max_value = struct.unpack_from("<Bddd", buf)
+        if version != FORMAT_VERSION:
+            raise ValueError(f"Unsupported sketch format {version}")
+
+        sketch = cls(accuracy)
+        pos = struct.calcsize("<Bddd")
+        sketch.zero_count, pos = _read_varint(buf, pos)
+        num_bins, pos = _read_varint(buf, pos)
+        index = 0
+        for _ in range(num_bins):
+            delta, pos = _read_varint(buf, pos)
+            count, pos = _read_varint(buf, pos)
+            index += _unzigzag(delta)
+            sketch.bins[index] = count
+
+        sketch.count = sketch.zero_count + sum(sketch.bins.values())
+        if sketch.count:
+            sketch.min, sketch.max = min_value, max_value
+        return sketch
@@ -0,0 +1,122 @@
+"""
+p50/p95/p99 latency of the card endpoints, first idle and then while other
+threads hammer the metrics endpoints. Runs against a live server:
+
+    uvicorn app.main:app --workers 1
+    python -m benchmarks.card_latency_under_load --base-url http://localhost:8000
+
+Start the server with USER_CACHE_TTL_SECONDS=0 to also exercise the
+get_current_user lookup on every request. The benchmark set is deleted at
+the end; the throwaway bench-* user stays (there is no endpoint to delete it).
+"""
+import argparse
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.common import percentile
+
+
+def request(base_url: str, method: str, path: str, body=None, token: str = None):
+    headers = {"Content-Type": "application/json"}
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+    data = json.dumps(body).encode() if body is not None else None
+    req = urllib.request.Request(base_url + path, data=data, headers=headers, method=method)
+    try:
+        with urllib.request.urlopen(req, timeout=60) as response:
+            payload = response.read()
+            return response.status, json.loads(payload) if payload else None
+    except urllib.error.HTTPError as e:
+        return e.code, None
+
+
+def setup(base_url: str, cards: int):
+    email = f"bench-{uuid.uuid4().hex[:12]}@example.com"
+    status, body = request(base_url, "POST", "/api/auth/register", {"email": email, "password": "benchmark-password"})
+    if status != 200:
+        raise SystemExit(f"register failed: HTTP {status}")
+    token = body["token"]
+
+    _, new_set = request(base_url, "POST", "/api/sets", {"title": "Latency benchmark"}, token)
+    request(base_url, "POST", f"/api/sets/{new_set['set_id']}/cards/bulk", [
+        {"front_text": f"Question {i}", "back_text": f"Answer {i}", "order_number": i}
+        for i in range(cards)
+    ], token)
+    return token, new_set["set_id"]
+
+
+def measure_cards(base_url: str, token: str, set_id: int, requests: int, concurrency: int) -> dict:
+    paths = ["/api/sets", f"/api/sets/{set_id}/cards"]
+
+    def one(i):
+        start = time.perf_counter()
+        status, _ = request(base_url, "GET", paths[i % len(paths)], token=token)
+        return (time.perf_counter() - start) * 1000, status
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(requests)))
+
+    latencies = [ms for ms, _ in results]
+    return {
+        "requests": len(results),
+        "errors": sum(1 for _, status in results if status != 200),
+        "p50_ms": round(percentile(latencies, 0.5), 1),
+        "p95_ms": round(percentile(latencies, 0.95), 1),
+        "p99_ms": round(percentile(latencies, 0.99), 1),
+    }
+
+
+def metrics_load(base_url: str, token: str, stop: threading.Event, sent: list):
+    # Mix of single-event writes and dashboard reads, all on the async session
+    while not stop.is_set():
+        request(base_url, "POST", "/api/metrics/", {"type": "latency", "data": {"action": "bench", "duration": 12.5}}, token)
+        request(base_url, "POST", "/api/metrics/public", {"type": "pageLoad", "data": {"loadTime": 850}})
+        request(base_url, "GET", "/api/metrics/dashboard")
+        sent.append(3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--cards", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--metrics-threads", type=int, default=32)
+    args = parser.parse_args()
+
+    token, set_id = setup(args.base_url, args.cards)
+
+    idle = measure_cards(args.base_url, token, set_id, args.requests, args.concurrency)
+    print(f"card endpoints, idle:          {idle}")
+
+    stop = threading.Event()
+    sent = []
+    workers = [
+        threading.Thread(target=metrics_load, args=(args.base_url, token, stop, sent), daemon=True)
+        for _ in range(args.metrics_threads)
+    ]
+    for worker in workers:
+        worker.start()
+    start = time.perf_counter()
+    try:
+        loaded = measure_cards(args.base_url, token, set_id, args.requests, args.concurrency)
+    finally:
+        stop.set()
+        for worker in workers:
+            worker.join()
+    elapsed = time.perf_counter() - start
+
+    print(f"card endpoints, metrics load:  {loaded}")
+    print(f"metrics requests during run:   {sum(sent)} ({sum(sent) / elapsed:.0f}/s)")
+    print(f"p99 ratio loaded/idle:         {loaded['p99_ms'] / max(idle['p99_ms'], 0.001):.2f}x")
+
+    request(args.base_url, "DELETE", f"/api/sets/{set_id}", token=token)
+
+
+if __name__ == "__main__":
+    main()
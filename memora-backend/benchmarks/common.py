@@ -0,0 +1,79 @@
+"""
+Helpers shared by the database benchmarks. They seed data under a throwaway
+user in DATABASE_URL's database, so point it at a dev/bench database.
+"""
+import time
+import uuid
+from typing import Callable, List
+
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
+
+
+class StatementCounter:
+    """
+    Counts statements an engine sends to the database while active
+    """
+
+    def __init__(self, engine: Engine):
+        self.engine = engine
+        self.count = 0
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+    def __enter__(self):
+        self.count = 0
+        event.listen(self.engine, "before_cursor_execute", self._before_cursor_execute)
+        return self
+
+    def __exit__(self, *exc_info):
+        event.remove(self.engine, "before_cursor_execute", self._before_cursor_execute)
+
+
+def percentile(samples: List[float], q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def time_calls(fn: Callable, runs: int, warmup: int = 3) -> List[float]:
+    """
+    Milliseconds per call, after a few untimed warmup calls
+    """
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def create_bench_user(conn, label: str) -> int:
+    return conn.execute(text(
+        "INSERT INTO users (email, password_hash, created_at) "
+        "VALUES (:email, 'benchmark', now()) RETURNING user_id"
+    ), {"email": f"bench-{label}-{uuid.uuid4().hex[:8]}@example.com"}).scalar()
+
+
+def delete_bench_user(conn, user_id: int):
+    # Cards (and anything hanging off them) cascade from their sets
+    conn.execute(text("DELETE FROM flashcard_sets WHERE user_id = :user_id"), {"user_id": user_id})
+    conn.execute(text("DELETE FROM users WHERE user_id = :user_id"), {"user_id": user_id})
+
+
+def add_sets(conn, user_id: int, count: int, cards_per_set: int):
+    """
+    Bulk-create `count` sets with `cards_per_set` cards each in one statement
+    """
+    conn.execute(text(
+        "WITH new_sets AS ("
+        "  INSERT INTO flashcard_sets (user_id, title, created_at, updated_at)"
+        "  SELECT :user_id, 'Benchmark set ' || n, now(), now() FROM generate_series(1, :count) n"
+        "  RETURNING set_id"
+        ") "
+        "INSERT INTO flashcards (set_id, front_text, back_text, order_number, created_at, updated_at) "
+        "SELECT set_id, 'Question ' || c, 'Answer ' || c, c, now(), now() "
+        "FROM new_sets, generate_series(1, :cards) c"
+    ), {"user_id": user_id, "count": count, "cards": cards_per_set})
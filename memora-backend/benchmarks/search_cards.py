@@ -0,0 +1,130 @@
+"""
+GET /api/search (app.search.search_user_cards) on a large card table. Seeds --cards
+cards, a --owned-fraction of them belonging to the searching user and the
+rest to another user. Then, for common, medium and rare terms, it checks
+that the plan uses ix_flashcards_search and reports match counts and latency.
+
+    DATABASE_URL=postgresql://... python -m benchmarks.search_cards --cards 1000000
+
+The seeded users and cards are deleted afterwards unless --keep is given.
+"""
+import argparse
+import json
+import sys
+import time
+
+from sqlalchemy import func, literal_column, select, text
+
+from app.database import engine, SessionLocal
+from app.search import SEARCH_CONFIG, card_search_query, search_user_cards
+from app.models import CARD_SEARCH_DOCUMENT, Flashcard, FlashcardSet
+from benchmarks.common import create_bench_user, delete_bench_user, percentile, time_calls
+
+CARDS_PER_SET = 1000
+SEARCH_INDEX = "ix_flashcards_search"
+
+# (label, query): "cell" is on 1 card in 10, "topic42" on 1 in 5000, "mitochondrion" on 1 in 100000
+TERMS = [
+    ("common", "cell"),
+    ("medium", "topic42"),
+    ("rare", "mitochondrion"),
+    ("or", "cell or enzyme"),
+    ("no match", "xylophone"),
+]
+
+
+def seed_cards(conn, user_id: int, first: int, count: int):
+    """
+    Cards first..first+count-1 (the numbering drives which terms they contain)
+    """
+    conn.execute(text(
+        "WITH new_sets AS ("
+        "  INSERT INTO flashcard_sets (user_id, title, created_at, updated_at)"
+        "  SELECT :user_id, 'Search benchmark ' || s, now(), now()"
+        "  FROM generate_series(0, (:count - 1) / :per_set) s"
+        "  RETURNING set_id"
+        "), numbered AS ("
+        "  SELECT set_id, row_number() OVER (ORDER BY set_id) - 1 AS i FROM new_sets"
+        ") "
+        "INSERT INTO flashcards (set_id, front_text, back_text, category, order_number, created_at, updated_at) "
+        "SELECT numbered.set_id, "
+        "  'What does the ' || (ARRAY['cell', 'market', 'theorem', 'verb', 'planet', "
+        "    'river', 'enzyme', 'empire', 'protein', 'circuit'])[1 + n % 10] || ' do in topic' || (n % 5000), "
+        "  'Answer number ' || n || CASE WHEN n % 100000 = 0 THEN ' involves the mitochondrion' ELSE '' END, "
+        "  (ARRAY['biology', 'economics', 'math', 'language'])[1 + n % 4], "
+        "  n % :per_set, now(), now() "
+        "FROM generate_series(:first, :first + :count - 1) n "
+        "JOIN numbered ON numbered.i = (n - :first) / :per_set"
+    ), {"user_id": user_id, "first": first, "count": count, "per_set": CARDS_PER_SET})
+
+
+def plan_index_names(plan: dict) -> set:
+    names = {plan["Index Name"]} if "Index Name" in plan else set()
+    for child in plan.get("Plans", []):
+        names |= plan_index_names(child)
+    return names
+
+
+def explain(db, statement) -> dict:
+    compiled = statement.compile(dialect=engine.dialect)
+    plan = db.connection().exec_driver_sql(
+        "EXPLAIN (ANALYZE, FORMAT JSON) " + str(compiled), compiled.params
+    ).scalar()
+    return (json.loads(plan) if isinstance(plan, str) else plan)[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cards", type=int, default=1000000)
+    parser.add_argument("--owned-fraction", type=float, default=0.1)
+    parser.add_argument("--runs", type=int, default=30)
+    parser.add_argument("--keep", action="store_true", help="leave the seeded data in place")
+    args = parser.parse_args()
+
+    owned = int(args.cards * args.owned_fraction)
+    start = time.perf_counter()
+    with engine.begin() as conn:
+        user_id = create_bench_user(conn, "search")
+        other_id = create_bench_user(conn, "search-other")
+        seed_cards(conn, user_id, 1, owned)
+        seed_cards(conn, other_id, owned + 1, args.cards - owned)
+    with engine.begin() as conn:
+        conn.execute(text("ANALYZE flashcard_sets"))
+        conn.execute(text("ANALYZE flashcards"))
+    print(f"Seeded {args.cards} cards ({owned} searchable by the user) in {time.perf_counter() - start:.1f}s\n")
+
+    missing_index = []
+    try:
+        print(f"{'term':<10} {'query':<18} {'matches':>8} {'index':>6} {'plan ms':>8} {'p50 ms':>8} {'p95 ms':>8}")
+        with SessionLocal() as db:
+            for label, q in TERMS:
+                explained = explain(db, card_search_query(user_id, q, None, 20, 0))
+                uses_index = SEARCH_INDEX in plan_index_names(explained["Plan"])
+                if not uses_index:
+                    missing_index.append(q)
+                matches = db.execute(
+                    select(func.count()).select_from(Flashcard).join(FlashcardSet).where(
+                        FlashcardSet.user_id == user_id,
+                        literal_column(CARD_SEARCH_DOCUMENT).op("@@")(func.websearch_to_tsquery(SEARCH_CONFIG, q))
+                    )
+                ).scalar()
+
+                samples = time_calls(
+                    lambda: search_user_cards(db, user_id, q, None, 20, 0),
+                    args.runs
+                )
+                print(f"{label:<10} {q:<18} {matches:>8} {'yes' if uses_index else 'NO':>6} "
+                      f"{explained['Execution Time']:>8.2f} {percentile(samples, 0.5):>8.2f} {percentile(samples, 0.95):>8.2f}")
+    finally:
+        if not args.keep:
+            with engine.begin() as conn:
+                delete_bench_user(conn, user_id)
+                delete_bench_user(conn, other_id)
+
+    if missing_index:
+        print(f"\n{SEARCH_INDEX} not used for: {', '.join(missing_index)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Statements and latency of GET /api/sets (main.get_sets) as one user's set
+count grows, next to the old one-count-query-per-set version. The statement
+count should stay at 1; latency should only grow with the rows returned,
+not with a round trip per set.
+
+    DATABASE_URL=postgresql://... python -m benchmarks.sets_query_count --sizes 10 100 500 1000
+"""
+import argparse
+from types import SimpleNamespace
+
+from sqlalchemy import text
+
+from app.database import engine, SessionLocal
+from app.main import get_sets
+from app.models import Flashcard, FlashcardSet
+from benchmarks.common import StatementCounter, add_sets, create_bench_user, delete_bench_user, percentile, time_calls
+
+
+def get_sets_n_plus_one(current_user, db):
+    # GET /api/sets before the grouped query, kept for comparison
+    sets = db.query(FlashcardSet).filter(FlashcardSet.user_id == current_user.user_id).all()
+    return [
+        (s.set_id, db.query(Flashcard).filter(Flashcard.set_id == s.set_id).count())
+        for s in sets
+    ]
+
+
+def measure(fn, current_user, size: int, runs: int) -> tuple:
+    with SessionLocal() as db:
+        with StatementCounter(engine) as counter:
+            result = fn(current_user=current_user, db=db)
+        assert len(result) == size
+        samples = time_calls(lambda: fn(current_user=current_user, db=db), runs)
+    return counter.count, percentile(samples, 0.5), percentile(samples, 0.95)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 50, 200, 500, 1000])
+    parser.add_argument("--cards-per-set", type=int, default=20)
+    parser.add_argument("--runs", type=int, default=50)
+    args = parser.parse_args()
+
+    with engine.begin() as conn:
+        user_id = create_bench_user(conn, "sets")
+    current_user = SimpleNamespace(user_id=user_id)
+
+    try:
+        print(f"{'sets':>6} {'statements':>10} {'p50 ms':>8} {'p95 ms':>8}   "
+              f"{'N+1 statements':>14} {'N+1 p50 ms':>10}")
+        created = 0
+        for size in sorted(args.sizes):
+            with engine.begin() as conn:
+                add_sets(conn, user_id, size - created, args.cards_per_set)
+                conn.execute(text("ANALYZE flashcard_sets"))
+                conn.execute(text("ANALYZE flashcards"))
+            created = size
+
+            statements, p50, p95 = measure(get_sets, current_user, size, args.runs)
+            old_statements, old_p50, _ = measure(get_sets_n_plus_one, current_user, size, max(args.runs // 10, 1))
+            print(f"{size:>6} {statements:>10} {p50:>8.2f} {p95:>8.2f}   {old_statements:>14} {old_p50:>10.2f}")
+    finally:
+        with engine.begin() as conn:
+            delete_bench_user(conn, user_id)
+
+
+if __name__ == "__main__":
+    main()
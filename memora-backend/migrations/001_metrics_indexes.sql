@@ -0,0 +1,17 @@
+-- Composite indexes for the metrics table.
+-- Base.metadata.create_all only creates missing tables, so existing databases need this applied by hand:
+--   psql "$DATABASE_URL" -f migrations/001_metrics_indexes.sql
+-- CONCURRENTLY avoids locking writes on a busy table; run it outside a transaction block.
+
+-- Dashboard / by-type queries: WHERE type = ? AND created_at > ?
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_metrics_type_created_at
+  ON metrics (type, created_at);
+
+-- /api/metrics/user/activity: WHERE user_id = ? AND created_at > ?
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_metrics_user_id_created_at
+  ON metrics (user_id, created_at);
+
+-- The single-column type index is a prefix of ix_metrics_type_created_at
+DROP INDEX CONCURRENTLY IF EXISTS ix_metrics_type;
+
+-- tests/test_metrics_indexes.py checks the planner picks these up
@@ -0,0 +1,51 @@
+-- Convert metrics into a table range-partitioned by day on created_at.
+-- New databases get the partitioned table from Base.metadata.create_all; this is for existing ones:
+--   psql "$DATABASE_URL" -f migrations/002_partition_metrics.sql
+-- Stop the API while it runs; metrics written during the copy would be lost.
+-- After this, app.partitions creates upcoming partitions and drops expired ones (METRICS_RETENTION_DAYS).
+
+BEGIN;
+
+ALTER TABLE metrics RENAME TO metrics_unpartitioned;
+ALTER SEQUENCE metrics_metric_id_seq RENAME TO metrics_unpartitioned_metric_id_seq;
+
+CREATE TABLE metrics (
+  metric_id SERIAL NOT NULL,
+  user_id INTEGER REFERENCES users(user_id),
+  type VARCHAR NOT NULL,
+  data JSON NOT NULL,
+  created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+  PRIMARY KEY (metric_id, created_at)
+) PARTITION BY RANGE (created_at);
+
+CREATE INDEX ix_metrics_metric_id ON metrics (metric_id);
+CREATE INDEX ix_metrics_created_at ON metrics (created_at);
+CREATE INDEX ix_metrics_type_created_at ON metrics (type, created_at);
+CREATE INDEX ix_metrics_user_id_created_at ON metrics (user_id, created_at);
+
+-- One partition per day from the oldest kept row through a week ahead
+DO $$
+DECLARE
+  day DATE;
+  last_day DATE := (now() AT TIME ZONE 'utc')::date + 7;
+BEGIN
+  SELECT coalesce(min(created_at)::date, (now() AT TIME ZONE 'utc')::date)
+    INTO day FROM metrics_unpartitioned;
+  WHILE day <= last_day LOOP
+    EXECUTE format(
+      'CREATE TABLE IF NOT EXISTS %I PARTITION OF metrics FOR VALUES FROM (%L) TO (%L)',
+      'metrics_p' || to_char(day, 'YYYYMMDD'), day, day + 1
+    );
+    day := day + 1;
+  END LOOP;
+END $$;
+
+INSERT INTO metrics (metric_id, user_id, type, data, created_at)
+SELECT metric_id, user_id, type, data, coalesce(created_at, now() AT TIME ZONE 'utc')
+FROM metrics_unpartitioned;
+
+SELECT setval('metrics_metric_id_seq', coalesce((SELECT max(metric_id) FROM metrics), 1));
+
+DROP TABLE metrics_unpartitioned;
+
+COMMIT;
@@ -0,0 +1,5 @@
+-- Keyset pagination index for GET /api/sets/{set_id}/cards.
+--   psql "$DATABASE_URL" -f migrations/003_flashcards_keyset_index.sql
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_flashcards_set_order_card
+  ON flashcards (set_id, coalesce(order_number, 0), card_id);
@@ -0,0 +1,39 @@
+-- Indexes, uniqueness and delete cascades for flashcard_links (and cards under sets).
+--   psql "$DATABASE_URL" -f migrations/004_flashcard_links_constraints.sql
+
+BEGIN;
+
+-- Links orphaned by earlier card deletes (the ORM used to null the FK)
+DELETE FROM flashcard_links WHERE from_card_id IS NULL OR to_card_id IS NULL;
+
+-- Keep the oldest link of each duplicated pair
+DELETE FROM flashcard_links l
+USING flashcard_links dup
+WHERE l.from_card_id = dup.from_card_id
+  AND l.to_card_id = dup.to_card_id
+  AND l.link_id > dup.link_id;
+
+ALTER TABLE flashcard_links
+  ALTER COLUMN from_card_id SET NOT NULL,
+  ALTER COLUMN to_card_id SET NOT NULL;
+
+-- Also serves lookups by from_card_id
+ALTER TABLE flashcard_links
+  ADD CONSTRAINT uq_flashcard_links_from_to UNIQUE (from_card_id, to_card_id);
+
+CREATE INDEX IF NOT EXISTS ix_flashcard_links_to_card_id ON flashcard_links (to_card_id);
+
+ALTER TABLE flashcard_links
+  DROP CONSTRAINT IF EXISTS flashcard_links_from_card_id_fkey,
+  DROP CONSTRAINT IF EXISTS flashcard_links_to_card_id_fkey,
+  ADD CONSTRAINT flashcard_links_from_card_id_fkey
+    FOREIGN KEY (from_card_id) REFERENCES flashcards (card_id) ON DELETE CASCADE,
+  ADD CONSTRAINT flashcard_links_to_card_id_fkey
+    FOREIGN KEY (to_card_id) REFERENCES flashcards (card_id) ON DELETE CASCADE;
+
+ALTER TABLE flashcards
+  DROP CONSTRAINT IF EXISTS flashcards_set_id_fkey,
+  ADD CONSTRAINT flashcards_set_id_fkey
+    FOREIGN KEY (set_id) REFERENCES flashcard_sets (set_id) ON DELETE CASCADE;
+
+COMMIT;
@@ -0,0 +1,9 @@
+-- GIN index for GET /api/search. The expression must match CARD_SEARCH_DOCUMENT in app/models.py.
+--   psql "$DATABASE_URL" -f migrations/005_flashcards_search_index.sql
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_flashcards_search
+  ON flashcards USING gin ((
+    setweight(to_tsvector('english', coalesce(front_text, '')), 'A') ||
+    setweight(to_tsvector('english', coalesce(back_text, '')), 'B') ||
+    setweight(to_tsvector('english', coalesce(category, '')), 'C')
+  ));
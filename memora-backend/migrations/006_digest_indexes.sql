@@ -0,0 +1,9 @@
+-- Indexes for the daily study digest (app/digest.py), which walks users in
+-- user_id ranges. email_digests itself is new and is created by the app.
+--   psql "$DATABASE_URL" -f migrations/006_digest_indexes.sql
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_flashcard_sets_user_id
+  ON flashcard_sets (user_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_metric_active_users_user_day
+  ON metric_active_users (user_id, day);
@@ -0,0 +1,27 @@
+-- Move password reset tokens out of users into password_reset_tokens, which
+-- stores only a SHA-256 of each token. Safe to run before or after the app
+-- (which also creates the table) is deployed.
+--   psql "$DATABASE_URL" -f migrations/007_password_reset_tokens.sql
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS password_reset_tokens (
+  token_hash VARCHAR(64) PRIMARY KEY,
+  user_id INTEGER NOT NULL REFERENCES users (user_id) ON DELETE CASCADE,
+  expires_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+  created_at TIMESTAMP WITHOUT TIME ZONE
+);
+CREATE INDEX IF NOT EXISTS ix_password_reset_tokens_user_id ON password_reset_tokens (user_id);
+CREATE INDEX IF NOT EXISTS ix_password_reset_tokens_expires_at ON password_reset_tokens (expires_at);
+
+-- Keep links that are still valid working
+INSERT INTO password_reset_tokens (token_hash, user_id, expires_at, created_at)
+SELECT encode(sha256(convert_to(reset_token, 'UTF8')), 'hex'), user_id, reset_token_expires, now()
+FROM users
+WHERE reset_token IS NOT NULL AND reset_token_expires > now() AT TIME ZONE 'utc'
+ON CONFLICT DO NOTHING;
+
+ALTER TABLE users DROP COLUMN IF EXISTS reset_token;
+ALTER TABLE users DROP COLUMN IF EXISTS reset_token_expires;
+
+COMMIT;
@@ -0,0 +1,5 @@
+-- Let users opt out of the daily study digest (app/digest.py skips them).
+-- Adding a column with a constant default doesn't rewrite the table.
+--   psql "$DATABASE_URL" -f migrations/008_users_digest_opt_out.sql
+
+ALTER TABLE users ADD COLUMN IF NOT EXISTS digest_opt_out BOOLEAN NOT NULL DEFAULT false;
@@ -0,0 +1,103 @@
+"""
+Plan regression test for the metrics indexes. Needs a Postgres to talk to:
+
+    DATABASE_URL=postgresql://... python -m unittest tests.test_metrics_indexes
+
+Everything runs in a scratch schema inside one transaction that is rolled back.
+"""
+import json
+import os
+import unittest
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+DATABASE_URL = os.getenv("DATABASE_URL")
+
+
+def index_names(plan: dict) -> set:
+    names = set()
+    if "Index Name" in plan:
+        names.add(plan["Index Name"])
+    for child in plan.get("Plans", []):
+        names |= index_names(child)
+    return names
+
+
+@unittest.skipUnless(DATABASE_URL, "DATABASE_URL is not set")
+class MetricsIndexPlanTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.engine = create_engine(DATABASE_URL)
+        try:
+            cls.engine.connect().close()
+        except OperationalError as e:
+            raise unittest.SkipTest(f"Postgres unavailable: {e}")
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.engine.dispose()
+
+    def setUp(self):
+        from app.database import Base
+        from app.models import User, Metric
+        from app.partitions import create_partitions
+
+        self.conn = self.engine.connect()
+        self.transaction = self.conn.begin()
+        schema = f"test_metrics_{uuid.uuid4().hex[:8]}"
+        self.conn.execute(text(f"CREATE SCHEMA {schema}"))
+        self.conn.execute(text(f"SET LOCAL search_path TO {schema}"))
+        Base.metadata.create_all(self.conn, tables=[User.__table__, Metric.__table__])
+
+        self.now = datetime.utcnow()
+        create_partitions(self.conn, (self.now - timedelta(days=7)).date(), self.now.date())
+        self.conn.execute(text(
+            "INSERT INTO users (user_id, email, password_hash) "
+            "SELECT n, 'user' || n || '@example.com', 'x' FROM generate_series(1, 50) n"
+        ))
+        self.conn.execute(text(
+            "INSERT INTO metrics (user_id, type, data, created_at) "
+            "SELECT 1 + n % 50, (ARRAY['page_load', 'latency', 'error', 'satisfaction'])[1 + n % 4], "
+            "'{\"duration\": 1}', :now - (n % 7) * interval '1 day' - (n % 3600) * interval '1 second' "
+            "FROM generate_series(1, 20000) n"
+        ), {"now": self.now})
+        self.conn.execute(text("ANALYZE metrics"))
+        # Partition indexes are named after the partition; map them back to the parent index
+        self.parent_index = dict(self.conn.execute(text(
+            "SELECT child.relname, parent.relname FROM pg_inherits i "
+            "JOIN pg_class child ON child.oid = i.inhrelid "
+            "JOIN pg_class parent ON parent.oid = i.inhparent "
+            "WHERE parent.relkind = 'I'"
+        )).all())
+
+    def tearDown(self):
+        self.transaction.rollback()
+        self.conn.close()
+
+    def plan_indexes(self, statement) -> set:
+        compiled = statement.compile(dialect=self.engine.dialect)
+        plan = self.conn.exec_driver_sql(
+            "EXPLAIN (FORMAT JSON) " + str(compiled), compiled.params
+        ).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return {self.parent_index.get(name, name) for name in index_names(plan[0]["Plan"])}
+
+    def test_metrics_by_type_uses_type_created_at_index(self):
+        from app.metrics import metrics_by_type_query
+
+        statement = metrics_by_type_query("error", self.now - timedelta(hours=1))
+        self.assertIn("ix_metrics_type_created_at", self.plan_indexes(statement))
+
+    def test_user_activity_uses_user_id_created_at_index(self):
+        from app.metrics import user_activity_query
+
+        statement = user_activity_query(7, self.now - timedelta(days=7))
+        self.assertIn("ix_metrics_user_id_created_at", self.plan_indexes(statement))
+
+
+if __name__ == "__main__":
+    unittest.main()
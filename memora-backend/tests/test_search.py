@@ -0,0 +1,93 @@
+"""
+Search snippets must be safe to render as HTML. The database test needs a
+Postgres:
+
+    DATABASE_URL=postgresql://... python -m unittest tests.test_search
+
+It runs in a scratch schema inside one transaction that is rolled back.
+"""
+import os
+import unittest
+import uuid
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from app.search import highlight_snippet, search_user_cards
+
+DATABASE_URL = os.getenv("DATABASE_URL")
+
+
+class HighlightSnippetTest(unittest.TestCase):
+    def test_escapes_text_and_marks_matches(self):
+        self.assertEqual(
+            highlight_snippet('<img src=x onerror="alert(1)"> \x02cell\x03 & more'),
+            '&lt;img src=x onerror=&quot;alert(1)&quot;&gt; <mark>cell</mark> &amp; more'
+        )
+
+
+@unittest.skipUnless(DATABASE_URL, "DATABASE_URL is not set")
+class SearchSnippetTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.engine = create_engine(DATABASE_URL)
+        try:
+            cls.engine.connect().close()
+        except OperationalError as e:
+            raise unittest.SkipTest(f"Postgres unavailable: {e}")
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.engine.dispose()
+
+    def setUp(self):
+        from app.database import Base
+        from app.models import User, FlashcardSet, Flashcard
+
+        self.conn = self.engine.connect()
+        self.transaction = self.conn.begin()
+        schema = f"test_search_{uuid.uuid4().hex[:8]}"
+        self.conn.execute(text(f"CREATE SCHEMA {schema}"))
+        self.conn.execute(text(f"SET LOCAL search_path TO {schema}"))
+        Base.metadata.create_all(self.conn, tables=[User.__table__, FlashcardSet.__table__, Flashcard.__table__])
+
+        self.user_id = self.conn.execute(text(
+            "INSERT INTO users (email, password_hash) VALUES ('search@example.com', 'x') RETURNING user_id"
+        )).scalar()
+        set_id = self.conn.execute(text(
+            "INSERT INTO flashcard_sets (user_id, title) VALUES (:user_id, 'Biology') RETURNING set_id"
+        ), {"user_id": self.user_id}).scalar()
+        self.conn.execute(text(
+            "INSERT INTO flashcards (set_id, front_text, back_text) VALUES (:set_id, :front, :back)"
+        ), {
+            "set_id": set_id,
+            # ts_headline drops what its parser sees as tags, but not these
+            "front": "<script>alert(document.cookie)</script> the cell<img/src=x onerror=alert(1)>is here",
+            "back": "The cell \x02membrane\x03 <svg/onload=alert(1)// surrounds it",
+        })
+
+    def tearDown(self):
+        self.transaction.rollback()
+        self.conn.close()
+
+    def test_markup_in_cards_is_escaped(self):
+        with Session(bind=self.conn) as db:
+            result = search_user_cards(db, self.user_id, "cell", None, 20, 0)
+
+        self.assertEqual(len(result["results"]), 1)
+        card = result["results"][0]
+        for snippet in (card["front_snippet"], card["back_snippet"]):
+            self.assertIn("<mark>cell</mark>", snippet)
+            self.assertNotIn("<script", snippet)
+            self.assertNotIn("<img", snippet)
+            self.assertNotIn("<svg", snippet)
+            self.assertEqual(snippet.count("<mark>"), snippet.count("</mark>"))
+            self.assertNotIn("\x02", snippet)
+        self.assertIn("&lt;img/src=x onerror=alert(1)&gt;", card["front_snippet"])
+        self.assertIn("&lt;svg/onload=alert", card["back_snippet"])
+        self.assertNotIn("<mark>membrane", card["back_snippet"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -212,6 +212,109 @@ export const deleteCard = async (cardId) => {
   });
 };
 
+/**
+ * Create many flashcards in one request
+ * @param {number} setId - ID of the set to add cards to
+ * @param {Array} cards - Card data objects (same shape as createCard)
+ * @returns {Promise} - Created flashcards
+ */
+export const createCardsBulk = async (setId, cards) => {
+  return await apiCall(`/api/sets/${setId}/cards/bulk`, {
+    method: 'POST',
+    body: JSON.stringify(cards),
+  });
+};
+
+/**
+ * Update many flashcards in one request (e.g. a whiteboard layout change)
+ * @param {number} setId - ID of the set the cards belong to
+ * @param {Array} updates - Partial card updates, each with a card_id
+ * @returns {Promise} - Updated flashcards
+ */
+export const updateCardsBulk = async (setId, updates) => {
+  return await apiCall(`/api/sets/${setId}/cards`, {
+    method: 'PATCH',
+    body: JSON.stringify(updates),
+  });
+};
+
+/**
+ * Delete many flashcards in one request
+ * @param {number} setId - ID of the set the cards belong to
+ * @param {Array} cardIds - IDs of the cards to delete
+ * @returns {Promise} - IDs that were deleted
+ */
+export const deleteCardsBulk = async (setId, cardIds) => {
+  return await apiCall(`/api/sets/${setId}/cards`, {
+    method: 'DELETE',
+    body: JSON.stringify({ card_ids: cardIds }),
+  });
+};
+
+/**
+ * Search across all of the user's cards
+ * @param {string} query - Search text (supports "quoted phrases" and -exclusions)
+ * @param {object} [options] - { setId, limit, offset }
+ * @returns {Promise} - { results, has_more, ... } with <mark>-highlighted snippets
+ */
+export const searchCards = async (query, { setId = null, limit = 20, offset = 0 } = {}) => {
+  const params = new URLSearchParams({ q: query, limit, offset });
+  if (setId !== null) {
+    params.append('set_id', setId);
+  }
+  return await apiCall(`/api/search?${params}`, {
+    method: 'GET',
+  });
+};
+
+/**
+ * Import a deck file (CSV, TSV/Anki text export, or JSON lines)
+ * @param {File|Blob} file - The deck file; sent as the raw request body
+ * @param {object} options - { format, setId, title, description, importId }
+ * @returns {Promise} - { import_id, set_id, imported, skipped, errors }
+ */
+export const importDeck = async (file, { format = 'csv', setId = null, title = null, description = null, importId = null } = {}) => {
+  const params = new URLSearchParams({ format });
+  if (setId !== null) params.append('set_id', setId);
+  if (title) params.append('title', title);
+  if (description) params.append('description', description);
+  if (importId) params.append('import_id', importId);
+  return await apiCall(`/api/sets/import?${params}`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/octet-stream' },
+    body: file,
+  });
+};
+
+/**
+ * Poll the progress of an import started with importDeck({ importId })
+ * @param {string} importId - The id passed to importDeck
+ * @returns {Promise} - { status, rows_imported, rows_skipped, bytes_read, ... }
+ */
+export const getImportProgress = async (importId) => {
+  return await apiCall(`/api/sets/import/${encodeURIComponent(importId)}`, {
+    method: 'GET',
+  });
+};
+
+/**
+ * Download a set as a file
+ * @param {number} setId - The set's ID
+ * @param {object} options - { format: 'csv'|'jsonl'|'json', links, images, gzip }
+ * @returns {Promise<Blob>} - The exported file
+ */
+export const exportDeck = async (setId, { format = 'jsonl', links = true, images = false, gzip = false } = {}) => {
+  const params = new URLSearchParams({ format, links, images, gzip });
+  const response = await fetch(`${API_BASE_URL}/api/sets/${setId}/export?${params}`, {
+    headers: authToken ? { Authorization: `Bearer ${authToken}` } : {},
+  });
+  if (!response.ok) {
+    const errorData = await response.json();
+    throw new Error(errorData.detail || 'Export failed');
+  }
+  return await response.blob();
+};
+
 // ==========================================
 // PROGRESS API FUNCTIONS
 // ==========================================
@@ -240,6 +343,52 @@ export const updateProgress = async (cardId, isMastered) => {
   });
 };
 
+// ==========================================
+// SPACED REPETITION API FUNCTIONS
+// ==========================================
+
+/**
+ * Record a review grade for a card
+ * @param {number} cardId - ID of the card
+ * @param {number} grade - 0 (forgot) to 5 (perfect recall)
+ * @returns {Promise} - Updated review schedule for the card
+ */
+export const recordReview = async (cardId, grade) => {
+  return await apiCall('/api/reviews', {
+    method: 'POST',
+    body: JSON.stringify({ card_id: cardId, grade }),
+  });
+};
+
+/**
+ * Get the next cards due for study
+ * @param {number} limit - Maximum number of cards to return
+ * @param {number} [setId] - Only return cards from this set
+ * @returns {Promise} - Due cards, most overdue first, then unseen cards
+ */
+export const getNextStudyCards = async (limit = 20, setId = null) => {
+  const params = new URLSearchParams({ limit });
+  if (setId !== null) {
+    params.append('set_id', setId);
+  }
+  return await apiCall(`/api/study/next?${params}`, {
+    method: 'GET',
+  });
+};
+
+/**
+ * Upload a batch of offline review events and get the next due cards
+ * @param {Array} events - { event_id, card_id, grade, reviewed_at } objects; event_id must be unique per review
+ * @param {number} limit - How many due cards to return
+ * @returns {Promise} - { applied, duplicate_event_ids, rejected_event_ids, due_cards }
+ */
+export const syncStudySession = async (events, limit = 20) => {
+  return await apiCall('/api/study/sync', {
+    method: 'POST',
+    body: JSON.stringify({ events, limit }),
+  });
+};
+
 // ==========================================
 // CARD LINKS API FUNCTIONS (for Whiteboard Mode)
 // ==========================================
@@ -255,6 +404,17 @@ export const getCardLinks = async (cardId) => {
   });
 };
 
+/**
+ * Get all card positions and links in a set with one request
+ * @param {number} setId - ID of the flashcard set
+ * @returns {Promise} - { set_id, cards: {card_id: [], ...}, links: {link_id: [], ...} } as parallel arrays
+ */
+export const getSetGraph = async (setId) => {
+  return await apiCall(`/api/sets/${setId}/graph`, {
+    method: 'GET',
+  });
+};
+
 /**
  * Create a link between two cards
  * @param {number} fromCardId - ID of the source card
@@ -29,14 +29,14 @@ export default function WhiteboardMode({ cards, setId, onExit, onCardsUpdated })
   useEffect(() => {
     const loadLinks = async () => {
       try {
-        // Get links for all cards in this set
-        const allLinks = [];
-        for (const card of cards) {
-          const response = await api.getCardLinks(card.card_id);
-          if (response && response.length > 0) {
-            allLinks.push(...response);
-          }
-        }
+        // Get every link in this set with a single request
+        const graph = await api.getSetGraph(setId);
+        const allLinks = graph.links.link_id.map((linkId, i) => ({
+          link_id: linkId,
+          from_card_id: graph.links.from_card_id[i],
+          to_card_id: graph.links.to_card_id[i],
+          link_type: graph.links.link_type[i],
+        }));
         setLinks(allLinks);
       } catch (error) {
         console.error('Failed to load links:', error);
@@ -46,7 +46,7 @@ export default function WhiteboardMode({ cards, setId, onExit, onCardsUpdated })
     if (editMode) {
       loadLinks();
     }
-  }, [cards, editMode]);
+  }, [cards, setId, editMode]);
 
   // Handle card drag start
   const handleMouseDown = (e, cardId) => {
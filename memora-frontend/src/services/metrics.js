@@ -8,6 +8,17 @@ class MetricsCollector {
     };
     this.sessionStart = Date.now();
     this.apiBaseUrl = 'http://localhost:8000';  // Your FastAPI URL
+
+    // Batching: send when the queue hits batchSize or after flushInterval ms
+    this.queue = [];
+    this.batchSize = 20;
+    this.flushInterval = 5000;
+    this.flushTimer = null;
+
+    // Don't lose queued metrics when the tab is closed or hidden
+    if (typeof window !== 'undefined') {
+      window.addEventListener('pagehide', () => this.flush({ keepalive: true }));
+    }
   }
 
   // Page Load Time
@@ -66,16 +77,35 @@ class MetricsCollector {
     });
   }
 
-    // Send metrics to backend
-  async sendToBackend(metricType, data) {
+  // Queue a metric; queued metrics are sent to the backend in batches
+  sendToBackend(metricType, data) {
+    this.queue.push({ type: metricType, data: data });
+
+    if (this.queue.length >= this.batchSize) {
+      this.flush();
+    } else if (!this.flushTimer) {
+      this.flushTimer = setTimeout(() => this.flush(), this.flushInterval);
+    }
+  }
+
+  // Send all queued metrics in a single request
+  async flush({ keepalive = false } = {}) {
+    if (this.flushTimer) {
+      clearTimeout(this.flushTimer);
+      this.flushTimer = null;
+    }
+    if (this.queue.length === 0) return;
+
+    const batch = this.queue.splice(0, this.queue.length);
+
     try {
       // Get auth token if available
       const token = localStorage.getItem('token');
       
       // Use public endpoint if no token (for metrics before login)
       const endpoint = token 
-        ? `${this.apiBaseUrl}/api/metrics`
-        : `${this.apiBaseUrl}/api/metrics/public`;
+        ? `${this.apiBaseUrl}/api/metrics/batch`
+        : `${this.apiBaseUrl}/api/metrics/public/batch`;
       
       const headers = {
         'Content-Type': 'application/json',
@@ -88,10 +118,8 @@ class MetricsCollector {
       const response = await fetch(endpoint, {
         method: 'POST',
         headers: headers,
-        body: JSON.stringify({
-          type: metricType,
-          data: data,
-        }),
+        body: JSON.stringify(batch),
+        keepalive: keepalive,
       });
       
       if (!response.ok) {